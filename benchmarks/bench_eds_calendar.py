@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- encoding: UTF-8 -*-
+''' Offline benchmark of the eds_calendar loading pipeline
+
+Builds synthetic EDS layouts (local calendar.ics files with recurring
+events and a VTIMEZONE, web cache.db files with the ECacheObjects
+schema) in a temporary XDG tree, imports eds/eds_calendar.py with
+Kupfer, GI and D-Bus stubbed out, and times fix_ical, _get_local_events,
+_get_web_events and EventSource.get_items for each event count. The
+CalendarView backend is timed against a stub ECal client that serves the
+local calendar's objects.
+
+Wall time and peak Python memory (tracemalloc) are printed as JSON:
+
+    python3 benchmarks/bench_eds_calendar.py --sizes 100 1000 > bench.json
+
+Only vobject (and its dateutil dependency) has to be installed.
+'''
+
+import argparse
+import builtins
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+PLUGIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, "eds", "eds_calendar.py")
+
+LOCAL_UID = "bench-local"
+WEB_UID = "bench-web"
+
+VTIMEZONE = """BEGIN:VTIMEZONE
+TZID:Europe/Berlin
+BEGIN:DAYLIGHT
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0200
+TZNAME:CEST
+DTSTART:19700329T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+END:DAYLIGHT
+BEGIN:STANDARD
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+TZNAME:CET
+DTSTART:19701025T030000
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+END:STANDARD
+END:VTIMEZONE"""
+
+
+### Stubs ##################################################################
+
+class _Anything (object):
+    ''' Accepts any call and attribute access '''
+    def __init__(self, *args, **kwargs):
+        self._props = {}
+
+    def __call__(self, *args, **kwargs):
+        return _Anything()
+
+    def __getattr__(self, name):
+        return _Anything()
+
+    def set_property(self, name, value):
+        self._props[name] = value
+
+    def get_property(self, name):
+        return self._props.get(name)
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def _install_stubs(data_home, cache_home):
+    builtins._ = lambda s: s
+
+    class Leaf (object):
+        def __init__(self, obj, name):
+            self.object = obj
+            self.name = name
+
+    class RunnableLeaf (Leaf):
+        def __init__(self, obj=None, name=None):
+            Leaf.__init__(self, obj, name)
+
+    class Source (object):
+        def __init__(self, name=None):
+            self.name = name
+
+        def initialize(self):
+            pass
+
+        def finalize(self):
+            pass
+
+        def mark_for_update(self, *args, **kwargs):
+            pass
+
+    class ToplevelGroupingSource (Source):
+        def __init__(self, name=None, category=None):
+            Source.__init__(self, name)
+
+    class FilesystemWatchMixin (object):
+        def monitor_directories(self, *directories, **kwargs):
+            return None
+
+    class PluginSettings (dict):
+        def __init__(self, *settings):
+            dict.__init__(self, ((s["key"], s["value"]) for s in settings))
+
+        def connect(self, *args):
+            pass
+
+    class SpawnError (Exception):
+        pass
+
+    glib = _Anything()
+    glib.timeout_add = lambda *args: 1
+    glib.timeout_add_seconds = lambda *args: 1
+    glib.source_remove = lambda *args: True
+
+    _module("gi", require_version=lambda *args: None)
+    _module("gi.repository", Gio=_Anything(), GLib=glib,
+            EDataServer=_Anything(), Unity=_Anything(), Dbusmenu=_Anything(),
+            ECal=_Anything(), ICalGLib=_Anything())
+    _module("dbus", SessionBus=_Anything, Interface=_Anything,
+            exceptions=types.SimpleNamespace(DBusException=Exception))
+
+    _module("xdg")
+    _module("xdg.BaseDirectory", xdg_data_home=data_home,
+            xdg_cache_home=cache_home, xdg_config_home=data_home)
+
+    def load_from_json(path):
+        with open(path) as f:
+            return json.load(f)
+
+    def save_to_json(obj, path):
+        with open(path, "w") as f:
+            json.dump(obj, f)
+
+    _module("libtools")
+    _module("libtools.json_tools", load_from_json=load_from_json,
+            save_to_json=save_to_json)
+
+    _module("kupfer")
+    _module("kupfer.plugin_support", PluginSettings=PluginSettings,
+            check_dbus_connection=lambda: None)
+    _module("kupfer.pretty", print_debug=lambda *args: None)
+    _module("kupfer.utils", SpawnError=SpawnError, AsyncCommand=_Anything,
+            spawn_async_raise=lambda argv: None)
+    _module("kupfer.textutils")
+    _module("kupfer.uiutils", show_notification=lambda *args, **kw: None)
+    _module("kupfer.objects", Leaf=Leaf, Action=Leaf, Source=Source,
+            TextSource=Source,
+            TextLeaf=Leaf, AppLeaf=Leaf, UrlLeaf=Leaf, RunnableLeaf=RunnableLeaf,
+            FileLeaf=Leaf, NotAvailableError=Exception,
+            OperationError=Exception)
+    _module("kupfer.obj")
+    _module("kupfer.obj.apps", AppLeafContentMixin=type("AppLeafContentMixin",
+                                                        (object,), {}))
+    _module("kupfer.obj.grouping",
+            ToplevelGroupingSource=ToplevelGroupingSource)
+    _module("kupfer.obj.helplib", FilesystemWatchMixin=FilesystemWatchMixin)
+    _module("kupfer.weaklib", dbus_signal_connect_weakly=lambda *args, **kw: None)
+    for name in ("kupfer.plugin_support", "kupfer.pretty", "kupfer.utils",
+                 "kupfer.textutils", "kupfer.uiutils"):
+        setattr(sys.modules["kupfer"], name.split(".")[1], sys.modules[name])
+
+
+class StubComponent (object):
+    ''' The parts of ICalGLib.Component that CalendarViewBackend uses '''
+    def __init__(self, text):
+        self.text = text
+        fields = dict(line.split(":", 1) for line in text.split("\r\n")
+                      if line.startswith(("UID:", "RECURRENCE-ID:")))
+        self.uid = fields["UID"]
+
+    def as_ical_string(self):
+        return self.text
+
+    def get_uid(self):
+        return self.uid
+
+    def get_recurrenceid(self):
+        return None
+
+
+class StubView (object):
+    ''' An ECal.ClientView that sends all objects once on start() '''
+    def __init__(self, components):
+        self.components = components
+        self.handlers = {}
+
+    def connect(self, signal, callback, *args):
+        self.handlers[signal] = (callback, args)
+
+    def set_flags(self, flags):
+        pass
+
+    def start(self):
+        callback, args = self.handlers["objects-added"]
+        callback(self, self.components, *args)
+
+    def stop(self):
+        pass
+
+
+class StubZone (object):
+    def get_component(self):
+        return types.SimpleNamespace(as_ical_string=lambda: VTIMEZONE)
+
+
+class StubCalendarClient (object):
+    ''' An ECal.Client serving the bare objects of an iCalendar file '''
+    def __init__(self, plugin, path):
+        self.components = []
+        for item in plugin.split_ical(path, {}):
+            begin = min(item.index("BEGIN:" + kind)
+                        for kind in plugin.ICAL_ITEM_KINDS
+                        if "BEGIN:" + kind in item)
+            end = item.rindex("END:VCALENDAR")
+            self.components.append(StubComponent(item[begin:end]))
+
+    def get_view(self, query, cancellable, callback, *args):
+        callback(self, None, *args)
+
+    def get_view_finish(self, result):
+        return True, StubView(self.components)
+
+    def get_timezone_sync(self, tzid, cancellable):
+        return True, StubZone()
+
+
+def _import_plugin():
+    spec = importlib.util.spec_from_file_location("eds_calendar", PLUGIN_PATH)
+    plugin = importlib.util.module_from_spec(spec)
+    sys.modules["eds_calendar"] = plugin
+    spec.loader.exec_module(plugin)
+    return plugin
+
+
+### Synthetic EDS data ####################################################
+
+def _event_start(rnd, today):
+    ''' A start time within two months around @today '''
+    day = today + datetime.timedelta(days=rnd.randint(-30, 45))
+    return datetime.datetime.combine(day, datetime.time(rnd.randint(7, 19),
+                                                        rnd.choice((0, 30))))
+
+
+def write_local_calendar(path, count, seed=0):
+    rnd = random.Random(seed)
+    today = datetime.date.today()
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0",
+             "PRODID:-//Kupfer Plugins Extra//Benchmark//EN", VTIMEZONE]
+    for i in range(count):
+        start = _event_start(rnd, today)
+        lines += ["BEGIN:VEVENT", "UID:local-%d@bench" % i,
+                  "DTSTAMP:20200101T000000Z",
+                  "SUMMARY:Local event %d" % i]
+        if i % 7 == 0:
+            lines.append("DTSTART;VALUE=DATE:" + start.strftime("%Y%m%d"))
+        else:
+            lines.append("DTSTART;TZID=Europe/Berlin:" +
+                         start.strftime("%Y%m%dT%H%M%S"))
+            lines.append("DTEND;TZID=Europe/Berlin:" +
+                         (start + datetime.timedelta(hours=1)).strftime("%Y%m%dT%H%M%S"))
+        if i % 10 == 0:
+            lines.append("RRULE:FREQ=WEEKLY;COUNT=20")
+        if i % 3 == 0:
+            lines.append("LOCATION:Room %d" % (i % 50))
+        if i % 4 == 0:
+            lines.append("ATTENDEE;CN=Person %d:mailto:person%d@example.org"
+                         % (i % 20, i % 20))
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", "TRIGGER:-PT15M",
+                  "END:VALARM", "END:VEVENT"]
+        if i % 20 == 0:
+            # Move the second occurrence of the series by five hours
+            moved = start + datetime.timedelta(days=7)
+            lines += ["BEGIN:VEVENT", "UID:local-%d@bench" % i,
+                      "DTSTAMP:20200101T000000Z",
+                      "SUMMARY:Local event %d (moved)" % i]
+            if i % 7 == 0:
+                lines += ["RECURRENCE-ID;VALUE=DATE:" + moved.strftime("%Y%m%d"),
+                          "DTSTART;VALUE=DATE:" +
+                          (moved + datetime.timedelta(days=1)).strftime("%Y%m%d")]
+            else:
+                lines += ["RECURRENCE-ID;TZID=Europe/Berlin:" +
+                          moved.strftime("%Y%m%dT%H%M%S"),
+                          "DTSTART;TZID=Europe/Berlin:" +
+                          (moved + datetime.timedelta(hours=5)).strftime("%Y%m%dT%H%M%S")]
+            lines.append("END:VEVENT")
+        if i % 5 == 0:
+            lines += ["BEGIN:VTODO", "UID:task-%d@bench" % i,
+                      "DTSTAMP:20200101T000000Z", "SUMMARY:Task %d" % i,
+                      "DUE;VALUE=DATE:" + start.strftime("%Y%m%d"),
+                      "END:VTODO"]
+    lines.append("END:VCALENDAR")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("\r\n".join(lines) + "\r\n")
+
+
+def write_web_cache(path, count, seed=1):
+    ''' Write a cache.db with the ECalCache flavour of ECacheObjects '''
+    rnd = random.Random(seed)
+    today = datetime.date.today()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE ECacheKeys (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE ECacheObjects (
+            ECacheUID TEXT PRIMARY KEY, ECacheREV TEXT, ECacheOBJ TEXT,
+            ECacheState INTEGER, custom_flags INTEGER,
+            occur_start TEXT, occur_end TEXT, due TEXT, completed TEXT,
+            summary TEXT, comp_type INTEGER, has_alarm INTEGER,
+            has_start INTEGER, has_recurrences INTEGER, location TEXT,
+            description TEXT, classification TEXT, status TEXT,
+            priority INTEGER, percent_complete INTEGER, categories TEXT,
+            attendees TEXT, organizer TEXT, has_attachment INTEGER);
+        CREATE INDEX IDX_OCCURSTART ON ECacheObjects (occur_start);
+        CREATE INDEX IDX_OCCUREND ON ECacheObjects (occur_end);
+        CREATE INDEX IDX_SUMMARY ON ECacheObjects (summary);
+        INSERT INTO ECacheKeys VALUES ('version', '3');
+    """)
+    rows = []
+    for i in range(count):
+        start = _event_start(rnd, today)
+        end = start + datetime.timedelta(hours=1)
+        recurring = i % 10 == 0
+        uid = "web-%d@bench" % i
+        obj = ["BEGIN:VEVENT", "UID:" + uid, "DTSTAMP:20200101T000000Z",
+               "DTSTART:" + start.strftime("%Y%m%dT%H%M%SZ"),
+               "DTEND:" + end.strftime("%Y%m%dT%H%M%SZ"),
+               "SUMMARY:web event %d" % i]
+        if recurring:
+            obj.append("RRULE:FREQ=DAILY;COUNT=10")
+            end = end + datetime.timedelta(days=9)
+        location = "office %d" % (i % 20) if i % 4 == 0 else None
+        if location:
+            obj.append("LOCATION:" + location)
+        obj.append("END:VEVENT")
+        rows.append((uid, "1", "\r\n".join(obj), 0, 0,
+                     start.strftime("%Y%m%d%H%M%S"),
+                     end.strftime("%Y%m%d%H%M%S"),
+                     "web event %d" % i, 1, 0, 1, int(recurring), location))
+    conn.executemany("""INSERT INTO ECacheObjects
+        (ECacheUID, ECacheREV, ECacheOBJ, ECacheState, custom_flags,
+         occur_start, occur_end, summary, comp_type, has_alarm, has_start,
+         has_recurrences, location)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+    conn.commit()
+    conn.close()
+
+
+### Measurement ###########################################################
+
+def measure(func, *args):
+    ''' Return (result, wall seconds, peak traced bytes) of func(*args) '''
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, wall, peak
+
+
+def bench_size(plugin, count, workers):
+    write_local_calendar(plugin._get_calendar_path(LOCAL_UID, "local-stub"), count)
+    write_web_cache(plugin._get_calendar_path(WEB_UID, "web"), count)
+    if os.path.exists(plugin.EVENT_INDEX_CACHE):
+        os.unlink(plugin.EVENT_INDEX_CACHE)
+    plugin.__kupfer_settings__["parse_workers"] = workers
+    plugin.occurrence_index = plugin.OccurrenceIndex()
+
+    def fix_ical():
+        return plugin.fix_ical(plugin._get_calendar_path(LOCAL_UID, "local-stub"))
+
+    def get_items():
+        plugin._event_store = None
+        source = plugin.EventSource()
+        source.initialize()
+        return source.get_items()
+
+    def tasks():
+        source = plugin.TaskSource()
+        source.initialize()
+        return source.get_items()
+
+    def views():
+        plugin._registered_timezones.clear()
+        client = StubCalendarClient(plugin,
+                plugin._get_calendar_path(LOCAL_UID, "local-stub"))
+        backend = plugin.CalendarViewBackend(
+                lambda: None, lambda registry, cal_uid, kind, callback: callback(client))
+        cal_dict = {LOCAL_UID: {"cal_name": "Local", "stub": "local-stub"}}
+        return backend.get_records(cal_dict, plugin._get_event_window())
+
+    def text_search():
+        source = plugin.EventTextSource()
+        return list(source.get_text_items("events at room 7"))
+
+    def upcoming():
+        leaf = plugin.UpcomingEvents()
+        leaf.get_description()
+        now = datetime.datetime.now().astimezone()
+        return plugin._get_upcoming_index().upcoming(now, 5)
+
+    results = {}
+    for name, func, args in (
+            ("fix_ical", fix_ical, ()),
+            ("_get_local_events", plugin._get_local_events, ([LOCAL_UID],)),
+            ("_get_web_events", plugin._get_web_events, ([WEB_UID],)),
+            ("EventSource.get_items (cold)", get_items, ()),
+            ("EventSource.get_items (warm)", get_items, ()),
+            ("TaskSource.get_items", tasks, ()),
+            ("CalendarViewBackend.get_records", views, ()),
+            ("EventTextSource.get_text_items", text_search, ()),
+            ("UpcomingEvents", upcoming, ())):
+        result, wall, peak = measure(func, *args)
+        results[name] = {"wall_s": round(wall, 6), "peak_bytes": peak}
+        if isinstance(result, str):
+            results[name]["output_chars"] = len(result)
+        else:
+            results[name]["items"] = len(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000, 100000],
+                        help="events per calendar")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parse_workers setting (1 = serial)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated EDS tree")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="eds-bench-")
+    data_home = os.path.join(root, "data")
+    cache_home = os.path.join(root, "cache")
+    _install_stubs(data_home, cache_home)
+    plugin = _import_plugin()
+    os.makedirs(os.path.dirname(plugin.EVENT_INDEX_CACHE), exist_ok=True)
+    os.makedirs(plugin.EDS_ALARMS_PATH, exist_ok=True)
+    plugin._load_calendars = lambda: {
+        LOCAL_UID: {"cal_name": "Local", "stub": "local-stub"},
+        WEB_UID: {"cal_name": "Web", "stub": "google-stub"},
+    }
+
+    report = {"python": sys.version.split()[0], "workers": args.workers,
+              "sizes": {}}
+    try:
+        for count in args.sizes:
+            report["sizes"][str(count)] = bench_size(plugin, count, args.workers)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
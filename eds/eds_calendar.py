@@ -1,6 +1,7 @@
 # -*- encoding: UTF-8 -*-
 __kupfer_name__ = _("Gnome Calendar")
-__kupfer_sources__ = ("EventSource", )
+__kupfer_sources__ = ("EventSource", "TaskSource")
+__kupfer_text_sources__ = ("EventTextSource", )
 __kupfer_actions__ = ("CreateGcalEvent", )
 __description__ = _("Search and open calendar events with Gnome-Calendar")
 __version__ = "2017.2"
@@ -10,18 +11,39 @@ __author__ = ""
 import os
 import gi
 import re
+import json
+import heapq
+import bisect
+import tempfile
 import sys
 import dbus
 import time
 import sqlite3
 import vobject
 import datetime
-import subprocess
 import hashlib, ast
-from contextlib import closing
+import multiprocessing
+from concurrent import futures
+from urllib.request import pathname2url
 
 import xdg.BaseDirectory as base
-from libtools.json_tools import load_from_json, save_to_json
+from libtools.json_tools import load_from_json
+try:
+	from libtools.json_tools import save_to_json_atomic
+except ImportError:
+	def save_to_json_atomic(obj, path):
+		''' Write @obj to @path as JSON through a temporary file and a rename,
+		so readers never see a half-written file '''
+		dirname = os.path.dirname(path)
+		os.makedirs(dirname, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+		try:
+			with os.fdopen(fd, "w") as tmp:
+				json.dump(obj, tmp)
+			os.replace(tmp_path, path)
+		except OSError:
+			os.unlink(tmp_path)
+			raise
 
 gi.require_version('Unity', '7.0')
 gi.require_version('Gtk', '3.0')
@@ -34,7 +56,8 @@ from gi.repository import Unity, Dbusmenu
 from kupfer import plugin_support
 from kupfer import pretty, utils
 from kupfer import textutils
-from kupfer.objects import Leaf, Action, Source
+from kupfer import uiutils
+from kupfer.objects import Leaf, Action, Source, TextSource
 from kupfer.objects import TextLeaf, NotAvailableError, AppLeaf
 from kupfer.objects import UrlLeaf, RunnableLeaf, FileLeaf
 from kupfer.obj.apps import AppLeafContentMixin
@@ -44,6 +67,40 @@ from kupfer.weaklib import dbus_signal_connect_weakly
 
 plugin_support.check_dbus_connection()
 
+__kupfer_settings__ = plugin_support.PluginSettings(
+    {
+        "key": "parse_workers",
+        "label": _("Calendar parsing processes (0 = one per CPU, 1 = serial)"),
+        "type": int,
+        "value": 1,
+    },
+    {
+        "key": "refresh_quiet_period",
+        "label": _("Wait for calendar changes to settle (ms)"),
+        "type": int,
+        "value": 2000,
+    },
+    {
+        "key": "gcal_cache_ttl",
+        "label": _("Refresh Google calendar list after (hours)"),
+        "type": int,
+        "value": 24,
+    },
+    {
+        "key": "calendar_backend",
+        "label": _("Read calendars from"),
+        "type": str,
+        "value": "files",
+        "alternatives": ("files", "views"),
+    },
+    {
+        "key": "upcoming_count",
+        "label": _("Number of upcoming events to show"),
+        "type": int,
+        "value": 5,
+    },
+)
+
 
 Calendar_ID = "org.gnome.Calendar"
 
@@ -55,22 +112,77 @@ IFACE_NAME = "org.gnome.Shell.SearchProvider2"
 EDS_CAL_PATH = (os.path.join(base.xdg_data_home, "evolution/calendar"))
 EDS_CAL_WEB_PATH = (os.path.join(base.xdg_cache_home, "evolution/calendar"))
 EDS_ALARMS_PATH = (os.path.join(base.xdg_data_home, "evolution/calendar/alarms"))
+EDS_TASKS_PATH = (os.path.join(base.xdg_data_home, "evolution/tasks"))
+EDS_TASKS_WEB_PATH = (os.path.join(base.xdg_cache_home, "evolution/tasks"))
+EDS_MEMOS_PATH = (os.path.join(base.xdg_data_home, "evolution/memos"))
+EDS_MEMOS_WEB_PATH = (os.path.join(base.xdg_cache_home, "evolution/memos"))
+# Source kind: local directory, cache directory, local file, system source uid
+EDS_SOURCE_FILES = {
+    "calendar": (EDS_CAL_PATH, EDS_CAL_WEB_PATH, "calendar.ics", "system-calendar"),
+    "tasks": (EDS_TASKS_PATH, EDS_TASKS_WEB_PATH, "tasks.ics", "system-task-list"),
+    "memos": (EDS_MEMOS_PATH, EDS_MEMOS_WEB_PATH, "journal.ics", "system-memo-list"),
+}
 GCALD_CACHE = (os.path.join(base.xdg_data_home, "kupfer/plugins/gcald"))
+GCALD_QUEUE = (os.path.join(base.xdg_data_home, "kupfer/plugins/gcald_queue.json"))
+EVENT_INDEX_CACHE = (os.path.join(base.xdg_data_home, "kupfer/plugins/gcald_events.json"))
+EVENT_INDEX_VERSION = 5
+ALARM_ADVANCE = datetime.timedelta(minutes=15)
+GCALCLI_TIMEOUT = 60
+# Seconds after a CalendarView delta in which a write of the same calendar
+# is taken to be EDS saving that delta
+DELTA_WRITE_PERIOD = 10
 
-launcher = Unity.LauncherEntry.get_for_desktop_id ("org.gnome.Calendar.desktop")
 S_OLD = None
 
 RELOAD_AGIAN = False
 MAX_ITEMS = 200
-dt = datetime.datetime.today()
-now = datetime.datetime.now()
-m = dt.strftime('%m')
-d = dt.strftime('%d')
-EV_BEGIN = (str(dt.year)+str(m)+str(d))
 
-m = datetime.datetime(dt.year + int(dt.month / 12), ((dt.month % 12) + 1), 1)
-m = m.strftime('%m')
-EV_END = (str(dt.year)+str(m)+'01')
+# Set up on first use, see _get_launcher() and _get_event_window()
+_launcher = None
+_event_window = None
+
+
+def _get_launcher():
+    global _launcher
+    if _launcher is None:
+        _launcher = Unity.LauncherEntry.get_for_desktop_id ("org.gnome.Calendar.desktop")
+    return _launcher
+
+
+def _compute_event_window(today):
+    ''' Events from @today up to the first day of next month '''
+    next_month = datetime.date(today.year + today.month // 12,
+                               today.month % 12 + 1, 1)
+    return today.strftime("%Y%m%d"), next_month.strftime("%Y%m%d")
+
+
+def _get_event_window():
+    ''' Return (EV_BEGIN, EV_END) as YYYYMMDD strings '''
+    global _event_window
+    if _event_window is None:
+        _event_window = _compute_event_window(datetime.date.today())
+    return _event_window
+
+
+def _update_event_window():
+    ''' Move the event window to today; return True if it moved '''
+    global _event_window
+    window = _compute_event_window(datetime.date.today())
+    changed = window != _event_window
+    _event_window = window
+    return changed
+
+
+def _window_covers(window, other):
+    ''' Return True if events parsed for @window include all events of
+    @other; the window only shrinks from the start until the month ends '''
+    return window[1] == other[1] and window[0] <= other[0]
+
+
+def _seconds_to_midnight():
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    midnight = datetime.datetime.combine(tomorrow, datetime.time())
+    return int((midnight - datetime.datetime.now()).total_seconds()) + 1
 
 
 def _create_dbus_connection(SERVICE_NAME, OBJECT_NAME, IFACE_NAME, activate=False):
@@ -108,19 +220,186 @@ def spawn_async(argv):
     except utils.SpawnError as exc:
         raise OperationError(exc)
         
-def utc2local (utc):
-    epoch = time.mktime(utc.timetuple())
-    offset = datetime.datetime.fromtimestamp (epoch) - datetime.datetime.utcfromtimestamp (epoch)
-    return utc + offset
+class LocalZone (object):
+    ''' UTC offsets of the local time zone between timestamps @begin and @end
+
+    The offset transitions (DST changes) in that range are found once by
+    probing every PROBE seconds and bisecting to the exact second, so a
+    conversion is a bisect lookup. Times outside the range fall back to
+    the C library.
+    '''
+    PROBE = 6 * 3600
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end = end
+        self.window = None
+        self._starts = [begin]
+        self._offsets = [self._libc_offset(begin)]
+        t = begin
+        while t < end:
+            probe = min(t + self.PROBE, end)
+            offset = self._libc_offset(probe)
+            if offset != self._offsets[-1]:
+                lo, hi = t, probe
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self._libc_offset(mid) == self._offsets[-1]:
+                        lo = mid
+                    else:
+                        hi = mid
+                self._starts.append(hi)
+                self._offsets.append(offset)
+            t = probe
+        self._zones = {}
+
+    @staticmethod
+    def _libc_offset(timestamp):
+        return time.localtime(timestamp).tm_gmtoff
+
+    def offset_at(self, timestamp):
+        ''' UTC offset in seconds of the local zone at @timestamp '''
+        if self.begin <= timestamp <= self.end:
+            return self._offsets[bisect.bisect_right(self._starts, timestamp) - 1]
+        return self._libc_offset(timestamp)
+
+    def zone(self, offset):
+        tz = self._zones.get(offset)
+        if tz is None:
+            tz = self._zones[offset] = datetime.timezone(datetime.timedelta(seconds=offset))
+        return tz
+
+    def from_timestamp(self, timestamp):
+        ''' Aware local datetime of @timestamp '''
+        return datetime.datetime.fromtimestamp(timestamp,
+                                               self.zone(self.offset_at(timestamp)))
+
+    def localize(self, dt):
+        ''' Aware local datetime of @dt; naive (floating) times are local
+        wall clock times '''
+        if dt.tzinfo is not None:
+            return self.from_timestamp(dt.timestamp())
+        wall = (dt - EPOCH).total_seconds()
+        before = self.offset_at(wall - 86400)
+        after = self.offset_at(wall + 86400)
+        # Like Python, take the earlier time when the wall time is
+        # ambiguous and the offset from before a gap when it doesn't exist
+        valid = [o for o in (before, after) if self.offset_at(wall - o) == o]
+        offset = max(valid) if valid else before
+        return dt.replace(tzinfo=self.zone(offset))
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+_local_zone = None
+
+
+def _get_local_zone():
+    ''' The LocalZone of the event window, padded by two days '''
+    global _local_zone
+    window = _get_event_window()
+    if _local_zone is None or _local_zone.window != window:
+        ev_begin, ev_end = window
+        begin = datetime.datetime.strptime(ev_begin, "%Y%m%d") - EPOCH
+        end = datetime.datetime.strptime(ev_end, "%Y%m%d") - EPOCH
+        _local_zone = LocalZone(int(begin.total_seconds()) - 2 * 86400,
+                                int(end.total_seconds()) + 3 * 86400)
+        _local_zone.window = window
+    return _local_zone
+
+
+def _parse_occur_time(occur):
+    ''' Convert an ECalCache "YYYYMMDDHHMMSS" UTC time to local time '''
+    utc = datetime.datetime(int(occur[:4]), int(occur[4:6]), int(occur[6:8]),
+                            int(occur[8:10]), int(occur[10:12]), int(occur[12:14]))
+    return _get_local_zone().from_timestamp((utc - EPOCH).total_seconds())
+
+
+def _in_event_window(due):
+    ev_begin, ev_end = _get_event_window()
+    day = int(due.strftime("%Y%m%d"))
+    return int(ev_begin) <= day <= int(ev_end)
+
+
+def _get_sql_window():
+    ''' Return the event window as ECalCache occur_start/occur_end bounds,
+    padded by a day since the cache stores UTC and the window is local '''
+    ev_begin, ev_end = _get_event_window()
+    one_day = datetime.timedelta(days=1)
+    begin = datetime.datetime.strptime(ev_begin, "%Y%m%d") - one_day
+    end = datetime.datetime.strptime(ev_end, "%Y%m%d") + one_day
+    return begin.strftime("%Y%m%d000000"), end.strftime("%Y%m%d235959")
+
+
+def _localize(due):
+    ''' Return (start, all_day) for a DTSTART value @due, where start is a
+    tz-aware datetime in local time. Floating times are taken as local. '''
+    zone = _get_local_zone()
+    if isinstance(due, datetime.datetime):
+        return zone.localize(due), False
+    return zone.localize(datetime.datetime(due.year, due.month, due.day)), True
+
+
+class EventRecord (object):
+    ''' One event (or one occurrence of a recurring event), task or memo.
+    @kind is "event", "task" or "memo"; tasks and memos may have no start. '''
+    __slots__ = ("key", "uid", "cal_uid", "title", "start", "all_day",
+                 "location", "description", "attendees", "kind")
+
+    def __init__(self, key, uid, cal_uid, title, start, all_day, location=None,
+                 description=None, attendees=(), kind="event"):
+        self.kind = kind
+        self.key = key
+        self.uid = uid
+        self.cal_uid = cal_uid
+        self.title = title
+        self.start = start
+        self.all_day = all_day
+        self.location = location
+        self.description = description
+        self.attendees = tuple(attendees)
+
+    @classmethod
+    def from_due(cls, key, uid, cal_uid, title, due, location=None,
+                 description=None, attendees=(), kind="event"):
+        if due is None:
+            start, all_day = None, False
+        else:
+            start, all_day = _localize(due)
+        return cls(key, uid, cal_uid, title, start, all_day, location,
+                   description, attendees, kind)
+
+    @classmethod
+    def from_json(cls, data):
+        key, uid, cal_uid, title, start, all_day, location, description, \
+                attendees, kind = data
+        if start is not None:
+            start = datetime.datetime.fromisoformat(start)
+        return cls(key, uid, cal_uid, title, start, all_day, location,
+                   description, attendees, kind)
+
+    def to_json(self):
+        start = self.start.isoformat() if self.start is not None else None
+        return [self.key, self.uid, self.cal_uid, self.title, start,
+                self.all_day, self.location, self.description,
+                list(self.attendees), self.kind]
+
+
+def _format_due(event):
+    if event.all_day:
+        return event.start.strftime("%A %d %B %Y")
+    return event.start.strftime("%A %d %B %Y %I:%M %p")
         
         
 def _get_calendar_dirs(EDS_CAL_PATH, EDS_CAL_WEB_PATH):
     calendar_dirs = []
-    for d in os.listdir(EDS_CAL_PATH):
-        if d != "trash" and d!= "alarms":
-            dd = os.path.join(EDS_CAL_PATH, d)
-            calendar_dirs.append(dd)
+    if os.path.isdir(EDS_CAL_PATH):
+        for d in os.listdir(EDS_CAL_PATH):
+            if d != "trash" and d!= "alarms":
+                dd = os.path.join(EDS_CAL_PATH, d)
+                calendar_dirs.append(dd)
             
+    if not os.path.isdir(EDS_CAL_WEB_PATH):
+        return calendar_dirs
     for d in os.listdir(EDS_CAL_WEB_PATH):
         if d != "trash":
             dd = os.path.join(EDS_CAL_WEB_PATH, d)
@@ -130,335 +409,1560 @@ def _get_calendar_dirs(EDS_CAL_PATH, EDS_CAL_WEB_PATH):
     return calendar_dirs
 
 
+def _get_calendar_path(cal_uid, stub, kind="calendar"):
+	''' Return the file EDS keeps the items of @cal_uid in; @kind is the
+	kind of source, "calendar", "tasks" or "memos" '''
+	local_path, web_path, filename, system_uid = EDS_SOURCE_FILES[kind]
+	if stub == "local-stub":
+		if cal_uid == system_uid:
+			cal_uid = "system"
+		return os.path.join(local_path, cal_uid, filename)
+	return os.path.join(web_path, cal_uid, "cache.db")
+
+
+def _get_file_signature(path):
+	''' Return [mtime, size, inode] of @path, or None if it is missing.
+	A SQLite write-ahead log next to @path is part of the signature. '''
+	signature = []
+	for p in (path, path + "-wal"):
+		try:
+			st = os.stat(p)
+		except OSError:
+			if p == path:
+				return None
+			continue
+		signature.extend([st.st_mtime, st.st_size, st.st_ino])
+	return signature
+
+
 def _load_calendars():
-# Open a registry and get a list of all the calendars in EDS
+# Open a registry and get a list of all the calendars, task lists and
+# memo lists in EDS
 	registry = EDataServer.SourceRegistry.new_sync(None)
-	sources = EDataServer.SourceRegistry.list_enabled(registry, 
-		                         EDataServer.SOURCE_EXTENSION_CALENDAR)
-
 	cal_dict = {}
-	for source in sources:
-		cal_name = source.get_display_name()
-		if cal_name == "Birthdays & Anniversaries":
-			continue
-		cal_stub = source.get_parent()
-		cal_uid = source.get_uid()
-		cal_dict[cal_uid] = {"cal_name": cal_name, "stub": cal_stub}
+	for kind, extension in (("calendar", EDataServer.SOURCE_EXTENSION_CALENDAR),
+	                        ("tasks", EDataServer.SOURCE_EXTENSION_TASK_LIST),
+	                        ("memos", EDataServer.SOURCE_EXTENSION_MEMO_LIST)):
+		sources = EDataServer.SourceRegistry.list_enabled(registry, extension)
+		for source in sources:
+			cal_name = source.get_display_name()
+			if cal_name == "Birthdays & Anniversaries":
+				continue
+			cal_stub = source.get_parent()
+			cal_uid = source.get_uid()
+			cal_dict[cal_uid] = {"cal_name": cal_name, "stub": cal_stub,
+			                     "kind": kind}
 		
 	return cal_dict
 
 
 
-def _load_gcals():
-    if os.path.exists(GCALD_CACHE):
-        cal_data = file_get_contents(GCALD_CACHE)
-        cal_data = ast.literal_eval(cal_data)
-        gcald = {}
-        for c in cal_data:
-            gcald[c] = ('_' + c)
-    else:
-        cmd = 'gcalcli list | grep owner | awk -F" " \'{print $3}\''
-        cal_data = ((subprocess.check_output(cmd, shell=True)).decode("utf-8")).split("\n")
-        cal_data = list(filter(None, cal_data))
-        with open(GCALD_CACHE,'w') as f:
-            f.write(str(cal_data))
-            f.close
-        gcald = {}
-        for c in cal_data:
-            gcald[c] = ('_' + c)
+def _parse_gcalcli_list(output):
+    ''' Return the names of the calendars we own from `gcalcli list` output '''
+    calendars = []
+    for line in output.splitlines():
+        line = re.sub(r'\x1b\[[0-9;]*m', '', line)
+        fields = line.split(None, 1)
+        if len(fields) == 2 and fields[0] == "owner":
+            calendars.append(fields[1].strip())
+    return calendars
+
 
+class GcalendarCache (object):
+    ''' The list of Google calendars, cached in GCALD_CACHE
+
+    The cache is a JSON file with the calendar names and the time they
+    were read. Cached names are always served right away; once they are
+    older than the configured TTL, `gcalcli list` is run again in the
+    background and listeners are told when new names are in.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.calendars = None
+        self.timestamp = 0
+        self._refreshing = False
+        self._listeners = []
+
+    def _load(self):
+        self.calendars = []
+        if not os.path.exists(self.path):
+            return
+        cal_data = file_get_contents(self.path)
+        try:
+            cache = json.loads(cal_data)
+            self.calendars = cache["calendars"]
+            self.timestamp = cache["timestamp"]
+        except (ValueError, KeyError, TypeError):
+            # Written by older versions as a bare Python list
+            try:
+                self.calendars = list(ast.literal_eval(cal_data))
+            except (ValueError, SyntaxError):
+                pass
+
+    def get_calendars(self, on_update=None):
+        ''' Return the cached calendar names, refreshing them in the
+        background when stale; @on_update is called after a refresh '''
+        if self.calendars is None:
+            self._load()
+        ttl = __kupfer_settings__["gcal_cache_ttl"] * 3600
+        if time.time() - self.timestamp > ttl:
+            if on_update is not None:
+                self._listeners.append(on_update)
+            self.refresh()
+        return self.calendars
+
+    def refresh(self):
+        if self._refreshing:
+            return
+        self._refreshing = True
+        pretty.print_debug(__name__, "Refreshing Google calendar list")
+        utils.AsyncCommand(["gcalcli", "--nocolor", "list"], self._finished,
+                           GCALCLI_TIMEOUT)
+
+    def _finished(self, acommand, stdout, stderr):
+        self._refreshing = False
+        listeners, self._listeners = self._listeners, []
+        if acommand.exit_status != 0:
+            pretty.print_debug(__name__, "gcalcli list failed", stderr)
+            return
+        self.calendars = _parse_gcalcli_list(stdout.decode("utf-8"))
+        self.timestamp = time.time()
+        save_to_json_atomic({"timestamp": self.timestamp,
+                            "calendars": self.calendars}, self.path)
+        for listener in listeners:
+            listener()
+
+
+gcald_cache = GcalendarCache(GCALD_CACHE)
+
+
+def _load_gcals(on_update=None):
+    gcald = {}
+    for c in gcald_cache.get_calendars(on_update):
+        gcald[c] = ('_' + c)
     return gcald
 
 
 
-def fix_ical(ical_path):
+ICAL_ITEM_KINDS = ("VEVENT", "VTODO", "VJOURNAL")
+RECORD_KINDS = {"VEVENT": "event", "VTODO": "task", "VJOURNAL": "memo"}
 
+
+def split_ical(ical_path, timezones=None):
+	''' Read @ical_path once, line by line, and yield one self-contained
+	VCALENDAR string per VEVENT/VTODO/VJOURNAL item.
+
+	The calendar header (VERSION, PRODID and in particular VTIMEZONE) is
+	collected once per VCALENDAR and shared by every item, so splitting is
+	linear in the size of the file.
+
+	If a dict is passed as @timezones, VTIMEZONE components are stored in
+	it by TZID instead, and left out of the items.
+	'''
+	header = None
+	items = []
+	item = None
+	kind = None
+	tz_lines = None
 	with open(ical_path, 'r') as ical:
-		all = ical.read()
-
-	# Discard all carriage returns. Makes pattern matching easier.
-	# Output then doesn't contain them either.
-	all = all.replace('\r', '')
-
-	# Final result.
-	calendars = []
-
-	# Process each VCALENDAR.
-	for calendar_match in re.finditer(r'''^BEGIN:VCALENDAR$.*?^END:VCALENDAR$''',
-		                              all,
-		                              re.MULTILINE + re.DOTALL):
-		calendar = calendar_match.group(0)
-		# Find all individual items inside the calendar.
-		items = [m.group(0) for m in re.finditer(r'''^BEGIN:(?P<kind>VEVENT|VJOURNAL|VTODO)\n.*?^END:(?P=kind)\n''',
-		                                         calendar,
-		                                         re.MULTILINE + re.DOTALL)]
-		# Strip these items from the calendar. We need the remaining
-		# VERSION, PRODID, and in particular VTIMEZONE.
-		for item in items:
-		    calendar = calendar.replace(item, '', 1)
-		# Now inject one item after the other at the end to produce new VCALENDARs.
-		calendars.extend([calendar.replace('\nEND:VCALENDAR',
-		                                   '\n' + item + 'END:VCALENDAR').replace('\n', '\r\n')
-		                  for item in items])
-
-	# Now print result, with empty line as separator.
-	fixed_ical = ('\r\n\r\n'.join(calendars))
-	return fixed_ical
-	
+		for line in ical:
+			# Discard all carriage returns, they are put back on output.
+			line = line.rstrip('\r\n')
+			if item is not None:
+				item.append(line)
+				if line == "END:" + kind:
+					items.append(item)
+					item = None
+				continue
+			if tz_lines is not None:
+				tz_lines.append(line)
+				if line == "END:VTIMEZONE":
+					tzids = [l[5:] for l in tz_lines if l.startswith("TZID:")]
+					if tzids:
+						timezones[tzids[0]] = '\r\n'.join(tz_lines)
+					tz_lines = None
+				continue
+			if line == "BEGIN:VCALENDAR":
+				header = [line]
+				items = []
+			elif header is None:
+				continue
+			elif line == "BEGIN:VTIMEZONE" and timezones is not None:
+				tz_lines = [line]
+			elif line == "END:VCALENDAR":
+				head = '\r\n'.join(header) + '\r\n'
+				for item_lines in items:
+					yield (head + '\r\n'.join(item_lines) +
+					       '\r\nEND:VCALENDAR\r\n')
+				header = None
+				items = []
+			elif line.startswith("BEGIN:") and line[6:] in ICAL_ITEM_KINDS:
+				kind = line[6:]
+				item = [line]
+			else:
+				header.append(line)
+
+
+def fix_ical(ical_path):
+	''' Return the items of @ical_path as separate VCALENDARs, with an
+	empty line as separator '''
+	return '\r\n'.join(split_ical(ical_path))
+
+
+def _occurrence_key(event_uid, start):
+	''' Return the event_dict key of the occurrence of @event_uid at @start '''
+	if not isinstance(start, datetime.datetime):
+		return event_uid + ":" + start.strftime("%Y%m%d")
+	if start.tzinfo is not None:
+		start = start.astimezone(datetime.timezone.utc)
+		return event_uid + ":" + start.strftime("%Y%m%dT%H%M%SZ")
+	return event_uid + ":" + start.strftime("%Y%m%dT%H%M%S")
+
+
+def _is_recurring(vevent):
+	return 'rrule' in vevent.contents or 'rdate' in vevent.contents
+
+
+def _get_rule_hash(vevent):
+	''' Hash everything the occurrences of @vevent in the window depend on '''
+	rule = list(_get_event_window()) + [repr(vevent.dtstart.value)]
+	for name in ('rrule', 'rdate', 'exrule', 'exdate'):
+		for line in vevent.contents.get(name, ()):
+			rule.append(name + ":" + repr(line.value))
+	return hashlib.sha1("\n".join(rule).encode("utf-8")).hexdigest()
+
+
+def _expand_recurrence(vevent):
+	''' Lazily generate the occurrences of @vevent inside the event window,
+	honouring RRULE, RDATE, EXRULE and EXDATE '''
+	dtstart = vevent.dtstart.value
+	ev_begin, ev_end = _get_event_window()
+	begin = datetime.datetime.strptime(ev_begin, "%Y%m%d")
+	end = datetime.datetime.strptime(ev_end, "%Y%m%d").replace(hour=23,
+	                                                           minute=59,
+	                                                           second=59)
+	if isinstance(dtstart, datetime.datetime) and dtstart.tzinfo is not None:
+		begin = begin.astimezone()
+		end = end.astimezone()
+	try:
+		rruleset = vevent.getrruleset(addRDate=True)
+	except (ValueError, TypeError) as err:
+		pretty.print_debug(__name__, "Can't expand", vevent.uid.value, err)
+		rruleset = [dtstart] if _in_event_window(dtstart) else []
+	else:
+		rruleset = rruleset.between(begin, end, inc=True)
+	for occurrence in rruleset:
+		if not isinstance(dtstart, datetime.datetime):
+			occurrence = datetime.date(occurrence.year, occurrence.month,
+			                           occurrence.day)
+		yield occurrence
+
+
+class OccurrenceIndex (object):
+	''' Sorted occurrences of recurring events inside the event window
+
+	Expansions are cached per event uid and rule hash, so a recurring
+	event is only expanded again when its rule, its start or the event
+	window changed.
+	'''
+	def __init__(self):
+		self._occurrences = {}
+
+	def get_occurrences(self, event_uid, vevent):
+		rule_hash = _get_rule_hash(vevent)
+		cached = self._occurrences.get(event_uid)
+		if cached is not None and cached[0] == rule_hash:
+			return cached[1]
+		occurrences = sorted(_expand_recurrence(vevent))
+		self._occurrences[event_uid] = (rule_hash, occurrences)
+		return occurrences
+
+
+occurrence_index = OccurrenceIndex()
+
+
+def _add_vevent(event_dict, cal_uid, event_uid, vevent, title, loc,
+                description=None, attendees=()):
+	''' Add @vevent to @event_dict, with one entry per occurrence inside the
+	event window for recurring events.
+
+	A modified occurrence (with RECURRENCE-ID) takes the place of the
+	occurrence generated from its master event; if it was moved out of the
+	window, the key is set to None and must be dropped by the caller.
+	'''
+	def record(key, due):
+		return EventRecord.from_due(key, event_uid, cal_uid, title, due, loc,
+		                            description, attendees)
+
+	if 'recurrence-id' in vevent.contents:
+		key = _occurrence_key(event_uid, vevent.recurrence_id.value)
+		due = vevent.dtstart.value
+		if _in_event_window(due):
+			event_dict[key] = record(key, due)
+		else:
+			event_dict[key] = None
+	elif _is_recurring(vevent):
+		for due in occurrence_index.get_occurrences(event_uid, vevent):
+			key = _occurrence_key(event_uid, due)
+			if key not in event_dict:
+				event_dict[key] = record(key, due)
+	else:
+		due = vevent.dtstart.value
+		if _in_event_window(due):
+			event_dict[event_uid] = record(event_uid, due)
+
+
+def _get_attendees(vevent):
+	''' Return "Name email" strings for the attendees of @vevent '''
+	attendees = []
+	for attendee in vevent.contents.get('attendee', ()):
+		email = attendee.value
+		if email.lower().startswith("mailto:"):
+			email = email[7:]
+		name = attendee.params.get('CN', [""])[0]
+		attendees.append((name + " " + email).strip())
+	return attendees
+
 
-def _get_local_events(local_calendar_uids):
+def _is_completed(vtodo):
+	if 'completed' in vtodo.contents:
+		return True
+	status = vtodo.status.value.upper() if 'status' in vtodo.contents else ""
+	return status in ("COMPLETED", "CANCELLED")
+
+
+def _add_task_or_memo(event_dict, cal_uid, event_uid, component, title, loc,
+                      description):
+	''' Add VTODO or VJOURNAL @component to @event_dict.
+
+	Open tasks are kept whatever their due date, completed ones are left
+	out. Memos are kept inside the event window, or if they have no date.
+	'''
+	kind = RECORD_KINDS[component.name]
+	contents = component.contents
+	due = None
+	if kind == "task":
+		if _is_completed(component):
+			return
+		if 'due' in contents:
+			due = component.due.value
+	if due is None and 'dtstart' in contents:
+		due = component.dtstart.value
+	if kind == "memo" and due is not None and not _in_event_window(due):
+		return
+	event_dict[event_uid] = EventRecord.from_due(event_uid, event_uid, cal_uid,
+	                                             title, due, loc, description,
+	                                             kind=kind)
+
+
+def _add_calendar_object(event_dict, cal_uid, stub, vevent):
+	''' Add the records of VEVENT, VTODO or VJOURNAL @vevent of calendar
+	@cal_uid to @event_dict '''
+	if 'summary' not in vevent.contents:
+		return
+	event_uid = cal_uid + ":" + vevent.uid.value
+	title = vevent.summary.value
+	if 'location' in vevent.contents:
+		loc = vevent.location.value
+	else:
+		loc = None
+	if 'description' in vevent.contents:
+		description = vevent.description.value
+	else:
+		description = None
+	if stub != "local-stub":
+		title = title.title()
+		if loc:
+			loc = loc.title()
+	if vevent.name != "VEVENT":
+		_add_task_or_memo(event_dict, cal_uid, event_uid, vevent, title, loc,
+		                  description)
+		return
+	_add_vevent(event_dict, cal_uid, event_uid, vevent, title, loc,
+	            description, _get_attendees(vevent))
+
+
+_registered_timezones = {}
+
+
+def _register_timezones(timezones):
+	''' Parse each VTIMEZONE in @timezones (TZID to VTIMEZONE text) once and
+	register it with vobject, so items referring to it by TZID can be read
+	without carrying their own copy '''
+	for tzid, vtimezone in timezones.items():
+		if _registered_timezones.get(tzid) == vtimezone:
+			continue
+		calendar = vobject.readOne("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" +
+		                           vtimezone + "\r\nEND:VCALENDAR\r\n")
+		vobject.icalendar.registerTzid(tzid, calendar.vtimezone.gettzinfo())
+		_registered_timezones[tzid] = vtimezone
+
+
+def _get_local_calendar_events(cal_uid, kind="calendar"):
+	''' Parse the iCalendar file of local source @cal_uid in one pass,
+	reading events, tasks and memos alike '''
 	event_dict = {}
-	for cal_uid in local_calendar_uids:
-		if cal_uid == "system-calendar":
-			cal_uid = "system"
-		ical_path = os.path.join(EDS_CAL_PATH, cal_uid + "/calendar.ics" )
-		with open(ical_path, 'r') as ical:
-			icalstream = ical.read()
-			icalstream = fix_ical(ical_path) 
-			#print (icalstream)
-			cal_obj = vobject.readComponents(icalstream)
-			for event in cal_obj:
-				event_uid = event.vevent.uid.value
-				if cal_uid == "system":
-					cal_uid = "system-calendar"
-				event_uid = cal_uid + ":" + event_uid
-				title = event.vevent.summary.value
-				due = event.vevent.dtstart.value
-				if int(due.strftime("%Y%m%d")) < int(EV_BEGIN) or \
-						int(due.strftime("%Y%m%d")) > int(EV_END):
-					continue
-				if isinstance(due, datetime.datetime):
-					due = due.strftime("%A %d %B %Y %I:%M %p")
-				else:
-					due = due.strftime("%A %d %B %Y")
-					
-				if 'location' in event.vevent.contents:
-					loc = event.vevent.location.value
-				else:
-					loc = None
-				event_dict[event_uid] = {"name": title, "due": due, "loc": loc}
-				
+	ical_path = _get_calendar_path(cal_uid, "local-stub", kind)
+	timezones = {}
+	for icalstream in split_ical(ical_path, timezones):
+		_register_timezones(timezones)
+		for component in _read_components(icalstream):
+			_add_calendar_object(event_dict, cal_uid, "local-stub", component)
+			
+	return dict((k, v) for k, v in event_dict.items() if v is not None)
+
+
+def _get_local_events(local_calendar_uids, workers=1):
+	calendars = [(cal_uid, "local-stub", "calendar")
+	             for cal_uid in local_calendar_uids]
+	event_dict = {}
+	for events in _parse_calendars(calendars, workers).values():
+		event_dict.update(events or {})
 	return event_dict
 	
 	
-def _get_web_events(web_calendar_uids):
-	event_dict = {}	
-	for cal_uid in web_calendar_uids:
-		cache_db = os.path.join(EDS_CAL_WEB_PATH, cal_uid + "/cache.db" )
+def _read_components(icalstring):
+	''' Return the VEVENTs, VTODOs and VJOURNALs of a bare component or
+	VCALENDAR string. A bare component is wrapped in a VCALENDAR, otherwise
+	vobject doesn't give it iCalendar behaviour (typed dates, getrruleset). '''
+	if not icalstring.lstrip().startswith("BEGIN:VCALENDAR"):
+		icalstring = ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" +
+		              icalstring.strip() + "\r\nEND:VCALENDAR\r\n")
+	calendar = vobject.readOne(icalstring)
+	return [c for c in calendar.getChildren() if c.name in ICAL_ITEM_KINDS]
+
+
+CACHE_DB_TIMEOUT = 0.2
+
+
+def _connect_cache_db(cache_db):
+	''' Open an EDS cache.db read-only, so we never contend with the
+	EDS writer; a busy writer makes reads fail fast rather than stall '''
+	uri = "file:%s?mode=ro" % pathname2url(cache_db)
+	return sqlite3.connect(uri, uri=True, timeout=CACHE_DB_TIMEOUT)
+
+
+def _get_table_columns(conn, table):
+	return set(row[1] for row in conn.execute("PRAGMA table_info(%s)" % table))
+
+
+class CacheDbPool (object):
+	''' One read-only connection per EDS cache.db, kept between refreshes
+
+	Statements are built from the table columns, which are read again
+	only when PRAGMA schema_version changes; sqlite3 keeps them prepared.
+	PRAGMA data_version tells whether another connection (EDS) committed
+	since the calendar was last read. Connections are reopened when the
+	file is replaced and never used across fork().
+	'''
+	def __init__(self):
+		self._pid = os.getpid()
+		self._conns = {}
+		self._seen = {}
+
+	def _entry(self, path):
+		if self._pid != os.getpid():
+			# Inherited from the parent process, leave them alone
+			self._pid = os.getpid()
+			self._conns = {}
+			self._seen = {}
+		inode = os.stat(path).st_ino
+		entry = self._conns.get(path)
+		if entry is not None and entry["inode"] != inode:
+			self.close(path)
+			entry = None
+		if entry is None:
+			entry = {"conn": _connect_cache_db(path), "inode": inode,
+			         "schema_version": None, "columns": {}}
+			self._conns[path] = entry
+		return entry
+
+	def connection(self, path):
+		return self._entry(path)["conn"]
+
+	def columns(self, path, table):
+		entry = self._entry(path)
+		conn = entry["conn"]
+		schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+		if schema_version != entry["schema_version"]:
+			entry["schema_version"] = schema_version
+			entry["columns"] = {}
+		if table not in entry["columns"]:
+			entry["columns"][table] = _get_table_columns(conn, table)
+		return entry["columns"][table]
+
+	def _data_version(self, path):
+		conn = self._entry(path)["conn"]
+		return conn.execute("PRAGMA data_version").fetchone()[0]
+
+	def mark_seen(self, path):
+		''' Note that @path is about to be read in full '''
+		try:
+			self._seen[path] = (self._entry(path)["inode"], self._data_version(path))
+		except (OSError, sqlite3.Error) as err:
+			pretty.print_debug(__name__, "Can't read data version of", path, err)
+			self._seen.pop(path, None)
+
+	def is_unchanged(self, path):
+		''' Return True if nothing was committed to @path since mark_seen() '''
+		seen = self._seen.get(path)
+		if seen is None:
+			return False
+		try:
+			return seen == (self._entry(path)["inode"], self._data_version(path))
+		except (OSError, sqlite3.Error):
+			return False
+
+	def close(self, path=None):
+		for p in ([path] if path is not None else list(self._conns)):
+			entry = self._conns.pop(p, None)
+			self._seen.pop(p, None)
+			if entry is not None:
+				entry["conn"].close()
+
+
+cache_db_pool = CacheDbPool()
+
+
+def _get_web_calendar_events(cal_uid, kind="calendar"):
+	''' Read events of web calendar @cal_uid from its EDS cache.db
+
+	When the cache has the occur_start/occur_end columns the date window
+	is applied in SQLite and summary, location and start are read from
+	the columns; the iCalendar object is only fetched and parsed for rows
+	that lack them. All-day events are stored at midnight, just like timed
+	events at 00:00 UTC, so rows starting at midnight are read from their
+	object as well.
+
+	Detached instances of recurring events are stored as "uid\nrid" and
+	are always read from their object, wherever they were moved to, so
+	they replace the occurrence their master generates.
+	'''
+	event_dict = {}
+	cache_db = _get_calendar_path(cal_uid, "web", kind)
+	conn = cache_db_pool.connection(cache_db)
+	columns = cache_db_pool.columns(cache_db, "ECacheObjects")
+	# Searchable text kept by ECalCache next to the summary
+	extra = ", ".join(col if col in columns else "NULL"
+	                  for col in ("description", "attendees"))
+	# Task and memo lists are read from their objects
+	if kind == "calendar" and \
+			"occur_start" in columns and "occur_end" in columns:
+		# Recurring events need their object to be expanded
+		if "has_recurrences" in columns:
+			recurring = "has_recurrences"
+		else:
+			recurring = "(occur_end IS NULL OR " \
+						"substr(occur_start, 1, 8) != substr(occur_end, 1, 8))"
+		win_begin, win_end = _get_sql_window()
+		c = conn.execute("""SELECT ECacheUID, summary, occur_start, location, %s,
+					 CASE WHEN summary IS NULL OR occur_start IS NULL
+						  OR substr(occur_start, 9) = '000000'
+						  OR instr(ECacheUID, char(10)) > 0
+						  OR %s THEN ECacheObj END
+					 FROM ECacheObjects
+					 WHERE occur_start IS NULL OR
+						   instr(ECacheUID, char(10)) > 0 OR
+						   (occur_start <= ? AND
+							(occur_end IS NULL OR occur_end >= ?))""" % (extra, recurring),
+					 (win_end, win_begin))
+	else:
+		c = conn.execute("""SELECT ECacheUID, summary, NULL, location, %s, ECacheObj
+					 FROM ECacheObjects""" % extra)
+	for event_uid, title, due, loc, description, attendees, icalstream in c:
+		if loc:
+			loc = loc.title()
+		if icalstream is None:
+			due = _parse_occur_time(due)
+			if not title or not _in_event_window(due):
+				continue
+			event_uid = cal_uid + ":" + event_uid
+			event_dict[event_uid] = EventRecord.from_due(event_uid, event_uid,
+														 cal_uid, title.title(),
+														 due, loc, description,
+														 attendees.split() if attendees else ())
+			continue
+		for event in _read_components(icalstream):
+			if title and 'summary' not in event.contents:
+				event.add('summary').value = title
+			_add_calendar_object(event_dict, cal_uid, "web", event)
+
+	return dict((k, v) for k, v in event_dict.items() if v is not None)
+
+
+def _get_web_events(web_calendar_uids, workers=1):
+	calendars = [(cal_uid, "web", "calendar") for cal_uid in web_calendar_uids]
+	event_dict = {}
+	for events in _parse_calendars(calendars, workers).values():
+		event_dict.update(events or {})
+	return event_dict
+
+
+def _get_parse_workers():
+	workers = __kupfer_settings__["parse_workers"]
+	if workers <= 0:
+		workers = os.cpu_count() or 1
+	return workers
+
+
+def _parse_calendar(cal_uid, stub, kind="calendar"):
+	''' Return the records of @cal_uid as plain, picklable objects, or
+	None if its file can't be read right now '''
+	try:
+		if stub == "local-stub":
+			return _get_local_calendar_events(cal_uid, kind)
+		return _get_web_calendar_events(cal_uid, kind)
+	except (sqlite3.OperationalError, OSError) as err:
+		# EDS holds a write lock, or removed the file while we looked at it;
+		# try again on the next refresh
+		pretty.print_debug(__name__, "Can't read", cal_uid, err)
+		return None
+
+
+def _parse_calendars(calendars, workers=1):
+	''' Parse @calendars, a list of (cal_uid, stub, kind) tuples, and return
+	a dict of cal_uid to records.
+
+	With more than one worker and more than one calendar, calendars are
+	parsed in a pool of forked processes, one task per calendar. A calendar
+	whose task fails is parsed again in this process. Forking a threaded
+	GTK process is not safe everywhere, so the pool is opt-in through the
+	parse_workers setting.
+	'''
+	workers = min(workers, len(calendars))
+	if workers <= 1:
+		return dict((calendar[0], _parse_calendar(*calendar))
+		            for calendar in calendars)
+
+	cal_events = {}
+	context = multiprocessing.get_context("fork")
+	with futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+		tasks = dict((pool.submit(_parse_calendar, *calendar), calendar)
+		             for calendar in calendars)
+		for task in futures.as_completed(tasks):
+			calendar = tasks[task]
+			cal_uid = calendar[0]
+			try:
+				cal_events[cal_uid] = task.result()
+			except Exception as err:
+				pretty.print_debug(__name__, "Parsing", cal_uid, "failed in pool", err)
+				cal_events[cal_uid] = _parse_calendar(*calendar)
+	return cal_events
+
+
+def _apply_event_delta(event_dict, cal_dict, added=(), modified=(), removed=()):
+	''' Patch @event_dict in place with the payload of EDS CalendarView
+	signals: iCalendar strings of @added and @modified objects and the
+	"uid\nrid" strings of @removed objects.
+
+	Added objects whose uid we already have are skipped without parsing,
+	they come from the initial notification of a view some other client
+	opened.
+
+	Return the set of calendar uids that changed, or None if the delta
+	can't be applied cleanly and the calendars must be read again: objects
+	whose uid we don't have (the file signatures keep that read cheap), and
+	changes to recurring events or their detached instances.
+	'''
+	cal_of_uid = {}
+	keys_of_uid = {}
+	for key, event in event_dict.items():
+		uid = event.uid[len(event.cal_uid) + 1:]
+		cal_of_uid[uid] = event.cal_uid
+		keys_of_uid.setdefault(uid, []).append(key)
+
+	def is_recurring(uid):
+		event_uid = cal_of_uid[uid] + ":" + uid
+		return any(key != event_uid for key in keys_of_uid[uid])
+
+	changed = set()
+	for uid_rid in removed:
+		uid, _sep, rid = uid_rid.partition("\n")
+		if rid:
+			return None
+		if uid in cal_of_uid:
+			for key in keys_of_uid.pop(uid):
+				del event_dict[key]
+			changed.add(cal_of_uid.pop(uid))
+
+	added = [(icalstring, True) for icalstring in added]
+	modified = [(icalstring, False) for icalstring in modified]
+	for icalstring, is_added in added + modified:
+		uids = re.findall(r"^UID:(.*?)\r?$", icalstring, re.M)
+		if is_added and uids and all(uid in cal_of_uid for uid in uids):
+			continue
+		try:
+			vevents = _read_components(icalstring)
+		except Exception as err:
+			pretty.print_debug(__name__, "Can't parse changed object", err)
+			return None
+		for vevent in vevents:
+			uid = vevent.uid.value
+			if is_added and uid in cal_of_uid:
+				continue
+			if uid not in cal_of_uid or \
+					'recurrence-id' in vevent.contents or _is_recurring(vevent) or \
+					is_recurring(uid):
+				return None
+			cal_uid = cal_of_uid[uid]
+			for key in keys_of_uid.pop(uid):
+				del event_dict[key]
+			new_events = {}
+			_add_calendar_object(new_events, cal_uid,
+			                     cal_dict[cal_uid]["stub"], vevent)
+			for key, event in new_events.items():
+				if event is not None:
+					event_dict[key] = event
+					keys_of_uid.setdefault(uid, []).append(key)
+			changed.add(cal_uid)
+	return changed
+
+
+class EventIndex (object):
+	''' Persistent per-calendar event index
+
+	Parsed events of each calendar are stored together with the mtime,
+	size and inode of the file backing that calendar, so that only
+	calendars whose file actually changed have to be parsed again.
+
+	The events are kept for the window they were parsed for and filtered
+	by the current window when read, so the index survives the daily move
+	of the window and is only dropped when the month ends.
+	'''
+	def __init__(self, index_path):
+		self.index_path = index_path
+		self.window = list(_get_event_window())
+		self.calendars = {}
+		self.dirty = False
+		self._load()
+
+	def _load(self):
+		if not os.path.exists(self.index_path):
+			return
+		try:
+			index = load_from_json(self.index_path)
+		except Exception as err:
+			pretty.print_debug(__name__, "Discarding event index", err)
+			return
+		if not index or index.get("version") != EVENT_INDEX_VERSION or \
+				not _window_covers(index.get("window") or ["", ""], self.window):
+			self.dirty = True
+			return
+		self.window = index["window"]
+		for cal_uid, entry in index.get("calendars", {}).items():
+			events = dict((key, EventRecord.from_json(data))
+			              for key, data in entry["events"].items())
+			self.calendars[cal_uid] = {"signature": entry["signature"],
+			                           "events": events}
+
+	def get_events(self, cal_dict, workers=1, cal_uids=None):
+		''' Return the events of all calendars in @cal_dict, parsing only
+		the calendars whose backing file changed.
+
+		If @cal_uids is given, only those calendars are checked for changes
+		and all others are served from the index as they are.
 		'''
-		with closing(sqlite3.connect(cache_db, timeout=1)) as conn:
-			c = conn.cursor()
-			c.execute("""SELECT ECacheObjects.occur_start
-                 		FROM ECacheObjects
-                 		WHERE occur_start IS NOT NULL
-                 		LIMIT 1""")
-                 
-			record = c.fetchone()
-			if record:
-				has_occur_start = True
-			else:
-				has_occur_start = False
-			
-			if has_occur_start:	
-				with closing(sqlite3.connect(cache_db, timeout=1)) as conn:
-					c = conn.cursor()
-					c.execute("""SELECT ECacheUID, summary, 
-								 occur_start, location
-								 FROM ECacheObjects
-								 WHERE occur_start BETWEEN ? AND ?
-								 ORDER BY occur_start DESC
-								 LIMIT ?""",
-								 (EV_BEGIN, EV_END, MAX_ITEMS, ))
-					 
-					for event_uid, title, due, loc in c:
-						event_uid = cal_uid + ":" + event_uid
-						title = title.title()
-						if due[8:] == "000000":
-							due = datetime.datetime.strptime(due[8:], "%Y%m%d")
-							due = utc2local(due)
-							due = due.strftime("%A %d %B %Y")
-						else:
-							due = datetime.datetime.strptime(due, "%Y%m%d%H%M%S")
-							due = utc2local(due)
-							due = due.strftime("%A %d %B %Y %I:%M %p")
-						if loc:
-							loc = loc.title()
-						event_dict[event_uid] = {"name": title, "due": due, "loc": loc}
-						
-			else:
-			'''
-		with closing(sqlite3.connect(cache_db, timeout=1)) as conn:
-			c = conn.cursor()
-			c.execute("""SELECT ECacheUID, summary, 
-						 ECacheObj, location
-						 FROM ECacheObjects
-						 LIMIT 15""")
-			for event_uid, title, icalstream, loc in c:
-				event_uid = cal_uid + ":" + event_uid
-				title = title.title()
-				event = vobject.readOne(icalstream)
-				#print (event.contents)
-				due = event.dtstart.value
-				if int(due.strftime("%Y%m%d")) < int(EV_BEGIN) or \
-						int(due.strftime("%Y%m%d")) > int(EV_END):
+		stale = []
+		signatures = {}
+		for cal_uid in cal_dict:
+			entry = self.calendars.get(cal_uid)
+			if entry is not None and cal_uids is not None and \
+					cal_uid not in cal_uids:
+				continue
+			stub = cal_dict[cal_uid]["stub"]
+			kind = cal_dict[cal_uid].get("kind", "calendar")
+			path = _get_calendar_path(cal_uid, stub, kind)
+			signature = _get_file_signature(path)
+			if entry is not None and signature is not None and \
+					entry["signature"] != signature and stub != "local-stub" and \
+					cache_db_pool.is_unchanged(path):
+				# Only a checkpoint or an aborted write touched the files
+				entry["signature"] = signature
+				self.dirty = True
+			if entry is None or signature is None or \
+					entry["signature"] != signature:
+				if stub != "local-stub" and signature is not None:
+					cache_db_pool.mark_seen(path)
+				stale.append((cal_uid, stub, kind))
+				signatures[cal_uid] = signature
+
+		if stale:
+			pretty.print_debug(__name__, "Parsing calendars",
+			                   [calendar[0] for calendar in stale])
+			cal_events = _parse_calendars(stale, workers)
+			for cal_uid, events in cal_events.items():
+				if events is None:
+					# Keep what we had and check again next time
+					entry = self.calendars.setdefault(cal_uid, {"events": {}})
+					entry["signature"] = None
 					continue
-				
-				if isinstance(due, datetime.datetime):
-					due = due.strftime("%A %d %B %Y %I:%M %p")
-				else:
-					due = due.strftime("%A %d %B %Y")
-					
-				if loc:
-					loc = loc.title()
-				event_dict[event_uid] = {"name": title, "due": due, "loc": loc}
-					 	
-	return event_dict
+				self.calendars[cal_uid] = {"signature": signatures[cal_uid],
+				                           "events": events}
+			self.dirty = True
+
+		event_dict = {}
+		for cal_uid in cal_dict:
+			event_dict.update(self.calendars[cal_uid]["events"])
+		if self.window != list(_get_event_window()):
+			event_dict = dict((key, event) for key, event in event_dict.items()
+			                  if event.kind == "task" or event.start is None or
+			                  _in_event_window(event.start))
+		return event_dict
+
+	def set_events(self, cal_uid, events):
+		''' Replace the indexed events of @cal_uid, keeping its signature '''
+		entry = self.calendars.get(cal_uid)
+		if entry is not None:
+			entry["events"] = events
+			self.dirty = True
+
+	def set_signature(self, cal_uid, signature):
+		entry = self.calendars.get(cal_uid)
+		if entry is not None:
+			entry["signature"] = signature
+			self.dirty = True
+
+	def set_window(self, window):
+		''' Forget all events when the event window moved past what they
+		were parsed for '''
+		window = list(window)
+		if not _window_covers(self.window, window):
+			self.window = window
+			self.calendars = {}
+			self.dirty = True
+
+	def prune(self, cal_uids):
+		''' Forget calendars that are not in @cal_uids anymore '''
+		for cal_uid in list(self.calendars):
+			if cal_uid not in cal_uids:
+				del self.calendars[cal_uid]
+				self.dirty = True
+
+	def save(self):
+		if not self.dirty:
+			return
+		calendars = {}
+		for cal_uid, entry in self.calendars.items():
+			events = dict((key, event.to_json())
+			              for key, event in entry["events"].items())
+			calendars[cal_uid] = {"signature": entry["signature"],
+			                      "events": events}
+		index = {"version": EVENT_INDEX_VERSION, "window": self.window,
+		         "calendars": calendars}
+		save_to_json_atomic(index, self.index_path)
+		self.dirty = False
+
 
 
-    
 def check_item_activated_callback(menuitem, a, b):#main menu item
     spawn_async(("gnome-calendar", "-u", b))
 
     
     
-def add_item_to_qlist(ql, item, name, uid, due, launcher):
-	y = str((now.year))
-	if "AM" in due or "PM" in due:
-		d = datetime.datetime.strptime(due[:-9], "%A %d %B %Y")
-		d1 = datetime.datetime.strptime(due, "%A %d %B %Y %I:%M %p")
-		name = name + " @ " + due[-8:] 
-		if now < d1:
-			add_event = True
-		else:
-			add_event = False
-	else:
-		d = datetime.datetime.strptime(due, "%A %d %B %Y")
-		name = name + " @all-day"
-		add_event = False
-    
-	d = d.date()
-	t = datetime.datetime.today()
-	t = t.date()
-	
-	if t == d and add_event:
-		print ("adding {} to quicklist".format(name))
-		item = Dbusmenu.Menuitem.new ()
-		item.property_set (Dbusmenu.MENUITEM_PROP_LABEL, name)
-		item.property_set_bool (Dbusmenu.MENUITEM_PROP_VISIBLE, True)
-		item.connect ("item-activated", check_item_activated_callback, uid)
-		ql.child_append (item)
-		#launcher.set_property("quicklist", ql)        
-	else:
-		pass        
-
-def update_alarm_disc(alarm_disc, event_uid, title, due):
-	#due = due.split(" IST.")[0]
-	d = datetime.datetime.strptime(due, "%A %d %B %Y %I:%M %p")
-	d_stamp = d.strftime("%s")
-	t = (int(d_stamp) * 1000 * 1000)
-	_d = d.strftime("%-I:%M %p")
-	d_timer = (d - datetime.timedelta(minutes = 15))
-
-	if now < d:
-		if event_uid not in alarm_disc:
-			alarm_disc[event_uid] = {"alarm": True, "due": due, "title": title}
+def _get_quicklist_label(event):
+	''' Return the quicklist label of @event, or None if @event is not a
+	timed event later today '''
+	if event.all_day:
+		return None
+	if event.start.date() != datetime.date.today() or \
+			event.start <= datetime.datetime.now().astimezone():
+		return None
+	return event.title + " @ " + event.start.strftime("%I:%M %p")
+
+
+def _midnight_after(now):
+	return datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+	                                 datetime.time(), now.tzinfo)
+
+
+class UpcomingIndex (object):
+	''' Start-time ordered index of the loaded events
+
+	Timed and all-day events are kept in two sorted lists of
+	(start timestamp, key), so "what is next" is a bisect plus a slice.
+	update() only moves the entries of added, changed and removed events.
+	'''
+	def __init__(self):
+		self._events = {}
+		self._timed = []
+		self._all_day = []
+
+	def _entries(self, event):
+		if event.all_day:
+			return self._all_day
+		return self._timed
+
+	def _remove(self, event):
+		entries = self._entries(event)
+		entry = (event.start.timestamp(), event.key)
+		i = bisect.bisect_left(entries, entry)
+		if i < len(entries) and entries[i] == entry:
+			del entries[i]
+
+	def update(self, event_dict):
+		for key in [k for k in self._events if k not in event_dict]:
+			self._remove(self._events.pop(key))
+		for key, event in event_dict.items():
+			old = self._events.get(key)
+			if old is event:
+				continue
+			if old is not None:
+				self._remove(old)
+			self._events[key] = event
+			bisect.insort(self._entries(event), (event.start.timestamp(), key))
+
+	def _slice(self, entries, begin, end=None, count=None):
+		lo = bisect.bisect_left(entries, (begin.timestamp(), ))
+		if end is None:
+			hi = len(entries)
 		else:
-			if alarm_disc[event_uid]["due"] != due:
-				alarm_disc[event_uid]["alarm"] = True
-				alarm_disc[event_uid]["due"] = due
-				alarm_disc[event_uid]["title"] = title
+			hi = bisect.bisect_left(entries, (end.timestamp(), ), lo)
+		if count is not None:
+			hi = min(hi, lo + count)
+		return [self._events[key] for _ts, key in entries[lo:hi]]
 
-	#Only contain events from current month after current time
-	alarm_disc1 = alarm_disc.copy() 
-	for event_uid, alarmd in alarm_disc.items():
-		alarm_due = alarm_disc[event_uid]["due"]
-		alarm_notify = alarm_disc[event_uid]["alarm"]
-		ad = datetime.datetime.strptime(due, "%A %d %B %Y %I:%M %p")
-		if (now > ad and not alarm_notify) or \
-				int(ad.strftime("%Y%m%d")) > int(EV_END):
-			alarm_disc1.pop(event_uid)
-		          
-	save_to_json(alarm_disc1,
-		    os.path.join(EDS_ALARMS_PATH, "alarms.json"))
-		    
-	return alarm_disc1   
+	def upcoming(self, now, count):
+		''' Return today's all-day events and the next @count timed events
+		starting after @now '''
+		today = datetime.datetime.combine(now.date(), datetime.time(), now.tzinfo)
+		return self._slice(self._all_day, today, _midnight_after(now)) + \
+				self._slice(self._timed, now, count=count)
 
+	def later_today(self, now):
+		''' Return the timed events starting after @now and before midnight '''
+		return self._slice(self._timed, now, _midnight_after(now))
 
+	def free_until(self, now):
+		''' Return the next timed event starting after @now, or None '''
+		events = self._slice(self._timed, now, count=1)
+		return events[0] if events else None
 
 
+_upcoming_index = None
 
-def _load_events():
-	#global ql
-	# Quicklist integration
-	alarm_disc = load_from_json(os.path.join(EDS_ALARMS_PATH, "alarms.json"))
-	#launcher = Unity.LauncherEntry.get_for_desktop_id ("org.gnome.Calendar.desktop")
-	ql_old =  launcher.get_property("quicklist")
-	if ql_old:
-		#for c in ql_old.get_children():
-			#ql_old.child_delete(c)
-		ql_old = None
-		launcher.set_property("quicklist", None)
-		ql = Dbusmenu.Menuitem.new ()
-	else:
-		pretty.print_debug(__name__, "ql is not defined yet")    
-		ql = Dbusmenu.Menuitem.new ()    
-    
-	''' Get all visible events from all active eds calendars '''
-	cal_dict = _load_calendars()
-	local_calendar_uids = []
-	web_calendar_uids = []
-	for cal_uid in cal_dict:
-		if cal_dict[cal_uid]["stub"] == "local-stub":
-			local_calendar_uids += [cal_uid]		
-		else:
-			web_calendar_uids += [cal_uid]
-			
-	if local_calendar_uids:
-		event_dict_local = 	_get_local_events(local_calendar_uids)
-	if web_calendar_uids:
-		event_dict_web = _get_web_events(web_calendar_uids)
-		
-	if not web_calendar_uids:
-		#eds always gives at least one local calendar by default.
-		event_dict = event_dict_local.copy()
-	else:
-		event_dict = event_dict_local.copy()
-		event_dict.update(event_dict_web)
-	#print (event_dict)
-	for event_uid, event_obj in event_dict.items():
-		d_keys = list(event_dict.keys())
-		item = "item" + str((d_keys.index(event_uid)))
-		title = event_obj['name']
-		due = event_obj['due']
-		loc = event_obj['loc']
-        
-		add_item_to_qlist(ql, item, title, event_uid, due, launcher)
-		#launcher.set_property("quicklist", ql)
 
-		if "AM" in due or "PM" in due:
-			alarm_disc = update_alarm_disc(alarm_disc, event_uid, title, due)            
+def _get_upcoming_index():
+	global _upcoming_index
+	if _upcoming_index is None:
+		_upcoming_index = UpcomingIndex()
+	return _upcoming_index
 
-		if loc:
-			due = due + ", " + loc #we intend to location on leaf description
-		oevent = Event(event_uid, title, due)
-		yield oevent
 
-	launcher.set_property("quicklist", ql)
+class QuicklistModel (object):
+	''' The Unity launcher quicklist of today's upcoming events
+
+	Menu items are kept per event key and only the items of events that
+	were added, changed or removed are touched on update, so D-Bus
+	traffic to the launcher follows the size of the change.
 	'''
-	alarm_disc1 = load_from_json(os.path.join(EDS_ALARMS_PATH, "alarms.json"))
-	for aid, ad in alarm_disc1.items():
-		if aid not in event_uids:
-		    alarm_disc1.pop(event_uid)            
-		    save_to_json(alarm_disc1,
-		        os.path.join(EDS_ALARMS_PATH, "alarms.json"))
-	'''    
-    
+	def __init__(self):
+		self.root = Dbusmenu.Menuitem.new ()
+		self._items = {}
+		self._published = False
+
+	def update(self, events):
+		''' Make the quicklist show today's upcoming @events, given in order
+		of their start time '''
+		wanted = {}
+		order = []
+		for event in events:
+			label = _get_quicklist_label(event)
+			if label is not None:
+				wanted[event.key] = (event.start, label, event.uid)
+				order.append(event.key)
+
+		for key in list(self._items):
+			item, entry = self._items[key]
+			if wanted.get(key) != entry:
+				self.root.child_delete(item)
+				del self._items[key]
+
+		for position, key in enumerate(order):
+			if key in self._items:
+				continue
+			start, label, uid = wanted[key]
+			pretty.print_debug(__name__, "adding {} to quicklist".format(label))
+			item = Dbusmenu.Menuitem.new ()
+			item.property_set (Dbusmenu.MENUITEM_PROP_LABEL, label)
+			item.property_set_bool (Dbusmenu.MENUITEM_PROP_VISIBLE, True)
+			item.connect ("item-activated", check_item_activated_callback, uid)
+			self.root.child_add_position (item, position)
+			self._items[key] = (item, wanted[key])
+
+	def publish(self, launcher):
+		if not self._published:
+			launcher.set_property("quicklist", self.root)
+			self._published = True
+
+
+_quicklist = None
+
+
+def _get_quicklist():
+	global _quicklist
+	if _quicklist is None:
+		_quicklist = QuicklistModel()
+	return _quicklist
+
+
+class AlarmStore (object):
+	''' Alarms of upcoming timed events, kept in alarms.json
+
+	Changes of a refresh are accumulated in memory and written once by
+	flush(). Pending alarms are kept in a heap ordered by firing time and
+	a single GLib timeout is armed for the earliest one.
+	'''
+	def __init__(self, path):
+		self.path = path
+		self.alarms = {}
+		self.dirty = False
+		self._heap = []
+		self._timeout = None
+		if os.path.exists(path):
+			self.alarms = load_from_json(path) or {}
+		# Drop alarms written in older formats
+		for key, alarm in list(self.alarms.items()):
+			try:
+				datetime.datetime.fromisoformat(alarm["due"]).timestamp()
+			except (KeyError, TypeError, ValueError):
+				del self.alarms[key]
+				self.dirty = True
+
+	def update(self, events):
+		''' Add or refresh the alarms of @events, all loaded events, and drop
+		stale alarms and those of events that are gone '''
+		current = datetime.datetime.now().astimezone()
+		keys = set()
+		for event in events:
+			if event.all_day or event.start <= current:
+				continue
+			keys.add(event.key)
+			due = event.start.isoformat()
+			alarm = self.alarms.get(event.key)
+			if alarm is None or alarm["due"] != due:
+				self.alarms[event.key] = {"alarm": True, "due": due,
+				                          "title": event.title}
+				self.dirty = True
+
+		#Only contain events from current month after current time, alarms
+		#missed while we weren't running are dropped rather than fired late
+		for key, alarm in list(self.alarms.items()):
+			alarm_due = datetime.datetime.fromisoformat(alarm["due"])
+			if key not in keys or current > alarm_due or \
+					int(alarm_due.strftime("%Y%m%d")) > int(_get_event_window()[1]):
+				del self.alarms[key]
+				self.dirty = True
+
+	def flush(self):
+		if not self.dirty:
+			return
+		save_to_json_atomic(self.alarms, self.path)
+		self.dirty = False
+
+	def schedule(self):
+		''' Rebuild the alarm heap and arm a timeout for the earliest alarm '''
+		self._heap = []
+		current = time.time()
+		for key, alarm in self.alarms.items():
+			due = datetime.datetime.fromisoformat(alarm["due"])
+			if alarm["alarm"] and due.timestamp() > current:
+				fire_at = due - ALARM_ADVANCE
+				self._heap.append((fire_at.timestamp(), key, alarm["due"]))
+		heapq.heapify(self._heap)
+		self._arm()
+
+	def cancel(self):
+		if self._timeout is not None:
+			GLib.source_remove(self._timeout)
+			self._timeout = None
+
+	def _arm(self):
+		self.cancel()
+		if self._heap:
+			delay = max(0, int(self._heap[0][0] - time.time()) + 1)
+			self._timeout = GLib.timeout_add_seconds(delay, self._on_timeout)
+
+	def _on_timeout(self):
+		self._timeout = None
+		current = time.time()
+		while self._heap and self._heap[0][0] <= current:
+			fire_at, key, due = heapq.heappop(self._heap)
+			alarm = self.alarms.get(key)
+			if alarm is None or not alarm["alarm"] or alarm["due"] != due:
+				continue
+			self._notify(alarm)
+			alarm["alarm"] = False
+			self.dirty = True
+		self.flush()
+		self._arm()
+		return False
+
+	def _notify(self, alarm):
+		due = datetime.datetime.fromisoformat(alarm["due"])
+		uiutils.show_notification(alarm["title"],
+				_("At %s") % due.astimezone().strftime("%I:%M %p"),
+				icon_name="org.gnome.Calendar")
+
+
+
+
+
+EVENT_TEXT_FIELDS = ("title", "location", "description", "attendees")
+
+
+def _tokenize(text):
+	return re.findall(r"\w+", text.lower())
+
+
+class EventTextIndex (object):
+	''' Inverted index from (field, word) to event keys
+
+	Kept in step with the loaded events by update(); only records that were
+	added, replaced or removed since the last update are (re)indexed.
+	'''
+	def __init__(self):
+		self._events = {}
+		self._postings = {}
+		self._words = None
+
+	def _event_words(self, event):
+		for field in EVENT_TEXT_FIELDS:
+			value = getattr(event, field)
+			if not value:
+				continue
+			if field == "attendees":
+				value = " ".join(value)
+			for word in set(_tokenize(value)):
+				yield field, word
+
+	def _add(self, event):
+		for fword in self._event_words(event):
+			keys = self._postings.get(fword)
+			if keys is None:
+				keys = self._postings[fword] = set()
+				self._words = None
+			keys.add(event.key)
+
+	def _remove(self, event):
+		for fword in self._event_words(event):
+			keys = self._postings.get(fword)
+			if keys is None:
+				continue
+			keys.discard(event.key)
+			if not keys:
+				del self._postings[fword]
+				self._words = None
+
+	def update(self, event_dict):
+		for key in [k for k in self._events if k not in event_dict]:
+			self._remove(self._events.pop(key))
+		for key, event in event_dict.items():
+			old = self._events.get(key)
+			if old is event:
+				continue
+			if old is not None:
+				self._remove(old)
+			self._events[key] = event
+			self._add(event)
+
+	def _lookup_prefix(self, field, prefix):
+		if self._words is None:
+			self._words = sorted(self._postings)
+		keys = set()
+		i = bisect.bisect_left(self._words, (field, prefix))
+		while i < len(self._words):
+			wfield, word = self._words[i]
+			if wfield != field or not word.startswith(prefix):
+				break
+			keys.update(self._postings[self._words[i]])
+			i += 1
+		return keys
+
+	def search(self, text, fields=EVENT_TEXT_FIELDS):
+		''' Return the events where every word of @text starts a word in
+		one of @fields, ordered by start time '''
+		keys = None
+		for prefix in _tokenize(text):
+			matches = set()
+			for field in fields:
+				matches.update(self._lookup_prefix(field, prefix))
+			keys = matches if keys is None else keys & matches
+			if not keys:
+				return []
+		if keys is None:
+			return []
+		return sorted((self._events[k] for k in keys), key=lambda e: e.start)
+
+
+_event_text_index = None
+
+
+def _get_event_text_index():
+	global _event_text_index
+	if _event_text_index is None:
+		_event_text_index = EventTextIndex()
+	return _event_text_index
+
+
+def _load_event_dict(event_index=None, cal_dict=None, cal_uids=None):
+	''' Get all visible events from all active eds calendars
+
+	Return the calendars and a dict of event key to EventRecord. Given the
+	current @cal_dict, only calendars in @cal_uids are checked for changes.
+	'''
+	if event_index is None:
+		event_index = EventIndex(EVENT_INDEX_CACHE)
+	event_index.set_window(_get_event_window())
+	if cal_dict is None:
+		cal_dict = _load_calendars()
+		cal_uids = None
+		event_index.prune(cal_dict)
+	event_dict = event_index.get_events(cal_dict, _get_parse_workers(), cal_uids)
+	event_index.save()
+	return cal_dict, event_dict
+
+
+def _get_view_query(kind):
+	''' Return the CalendarView S-expression for sources of @kind; open
+	tasks are wanted whatever their dates '''
+	if kind == "tasks":
+		return "#t"
+	begin, end = _get_sql_window()
+	return '(occur-in-time-range? (make-time "%sT%sZ") (make-time "%sT%sZ"))' % (
+			begin[:8], begin[8:], end[:8], end[8:])
+
+
+def _import_ecal():
+	''' ECal is only needed by the "views" backend, so it is imported on
+	first use '''
+	gi.require_version('ECal', '2.0')
+	from gi.repository import ECal
+	return ECal
+
+
+def _connect_calendar_client(registry, cal_uid, kind, callback):
+	''' Connect to source @cal_uid of @kind in the background and call
+	@callback with the ECal.Client '''
+	source = registry.ref_source(cal_uid)
+	if source is None:
+		return
+	ECal = _import_ecal()
+	source_type = {"calendar": ECal.ClientSourceType.EVENTS,
+	               "tasks": ECal.ClientSourceType.TASKS,
+	               "memos": ECal.ClientSourceType.MEMOS}[kind]
+
+	def on_connected(_source, result):
+		try:
+			client = ECal.Client.connect_finish(result)
+		except GLib.Error as err:
+			pretty.print_debug(__name__, "Can't connect to", cal_uid, err)
+			return
+		callback(client)
+
+	ECal.Client.connect(source, source_type, 5, None, on_connected)
+
+
+class CalendarViewBackend (object):
+	''' Read calendars through live EDS CalendarViews instead of files
+
+	One ECal.ClientView is kept open per source, with a time range query so
+	EDS does the filtering. Clients and views are opened in the background,
+	their objects arrive through the view signals. Objects are kept as
+	iCalendar strings by uid and recurrence id; a change re-reads only the
+	records of the uids it touches. @on_changed is called after each change.
+	'''
+	def __init__(self, on_changed, connect=_connect_calendar_client):
+		self._on_changed = on_changed
+		self._connect = connect
+		self._registry = None
+		self._window = None
+		self._clients = {}
+		self._views = {}
+		self._objects = {}
+		self._records = {}
+		self._keys = {}
+
+	def close(self):
+		for cal_uid in list(self._views):
+			self._close_view(cal_uid)
+
+	def _close_view(self, cal_uid):
+		view = self._views.pop(cal_uid)
+		if view is not None:
+			try:
+				view.stop()
+			except GLib.Error as err:
+				pretty.print_debug(__name__, "Stopping view of", cal_uid, err)
+		self._clients.pop(cal_uid, None)
+		self._objects.pop(cal_uid, None)
+		self._records.pop(cal_uid, None)
+		self._keys.pop(cal_uid, None)
+
+	def _open_view(self, cal_uid, info):
+		kind = info.get("kind", "calendar")
+		self._views[cal_uid] = None
+		self._objects[cal_uid] = {}
+		self._records[cal_uid] = {}
+		self._keys[cal_uid] = {}
+		if self._registry is None:
+			self._registry = EDataServer.SourceRegistry.new_sync(None)
+		try:
+			self._connect(self._registry, cal_uid, kind,
+			              lambda client: self._on_connected(client, cal_uid, info))
+		except GLib.Error as err:
+			pretty.print_debug(__name__, "Can't connect to", cal_uid, err)
+
+	def _on_connected(self, client, cal_uid, info):
+		if cal_uid not in self._views:
+			# Closed meanwhile
+			return
+		self._clients[cal_uid] = client
+		client.get_view(_get_view_query(info.get("kind", "calendar")), None,
+		                self._on_view_ready, cal_uid, info["stub"])
+
+	def _on_view_ready(self, client, result, cal_uid, stub):
+		try:
+			ret, view = client.get_view_finish(result)
+		except GLib.Error as err:
+			pretty.print_debug(__name__, "Can't open view of", cal_uid, err)
+			return
+		if not ret or self._clients.get(cal_uid) is not client:
+			return
+		view.connect("objects-added", self._on_objects_changed, cal_uid, stub)
+		view.connect("objects-modified", self._on_objects_changed, cal_uid, stub)
+		view.connect("objects-removed", self._on_objects_removed, cal_uid, stub)
+		view.set_flags(_import_ecal().ClientViewFlags.NOTIFY_INITIAL)
+		view.start()
+		self._views[cal_uid] = view
+
+	def _register_timezones(self, cal_uid, icalstring):
+		''' Objects of a view refer to time zones by TZID only; fetch the
+		ones vobject doesn't know yet from the client '''
+		for tzid in set(re.findall(r';TZID="?([^:;"]+)', icalstring)):
+			if tzid in _registered_timezones:
+				continue
+			try:
+				ret, zone = self._clients[cal_uid].get_timezone_sync(tzid, None)
+			except GLib.Error as err:
+				pretty.print_debug(__name__, "Unknown time zone", tzid, err)
+				continue
+			if ret and zone is not None:
+				_register_timezones({tzid: zone.get_component().as_ical_string().strip()})
+
+	def _update_records(self, cal_uid, stub, uids):
+		records = self._records[cal_uid]
+		objects = self._objects[cal_uid]
+		keys_of_uid = self._keys[cal_uid]
+		for uid in uids:
+			for key in keys_of_uid.pop(uid, ()):
+				del records[key]
+			new_records = {}
+			for icalstring in objects.get(uid, {}).values():
+				for component in _read_components(icalstring):
+					_add_calendar_object(new_records, cal_uid, stub, component)
+			new_keys = [k for k, v in new_records.items() if v is not None]
+			for key in new_keys:
+				records[key] = new_records[key]
+			if new_keys:
+				keys_of_uid[uid] = new_keys
+		self._on_changed()
+
+	def _on_objects_changed(self, view, components, cal_uid, stub):
+		objects = self._objects[cal_uid]
+		uids = set()
+		for component in components:
+			icalstring = component.as_ical_string()
+			self._register_timezones(cal_uid, icalstring)
+			rid = component.get_recurrenceid()
+			if rid is None or rid.is_null_time():
+				rid = ""
+			else:
+				rid = rid.as_ical_string()
+			uid = component.get_uid()
+			objects.setdefault(uid, {})[rid] = icalstring
+			uids.add(uid)
+		self._update_records(cal_uid, stub, uids)
+
+	def _on_objects_removed(self, view, component_ids, cal_uid, stub):
+		objects = self._objects[cal_uid]
+		uids = set()
+		for component_id in component_ids:
+			uid = component_id.get_uid()
+			rid = component_id.get_rid()
+			if rid:
+				objects.get(uid, {}).pop(rid, None)
+			else:
+				objects.pop(uid, None)
+			uids.add(uid)
+		self._update_records(cal_uid, stub, uids)
+
+	def get_records(self, cal_dict, window):
+		''' Return the records of all sources in @cal_dict; views are opened
+		for new sources, and all of them again when @window moved '''
+		if window != self._window:
+			self.close()
+			self._window = window
+		for cal_uid in list(self._views):
+			if cal_uid not in cal_dict:
+				self._close_view(cal_uid)
+		for cal_uid, info in cal_dict.items():
+			if cal_uid not in self._views:
+				self._open_view(cal_uid, info)
+		event_dict = {}
+		for records in self._records.values():
+			event_dict.update(records)
+		return event_dict
+
+
+class EventStore (object):
+	''' The records of all calendars, task lists and memo lists
+
+	Shared by EventSource and TaskSource, so the EDS data is read once
+	for both. invalidate() marks calendars to be checked again on the next
+	get_records() and calls the listeners, which mark their source for
+	update.
+	'''
+	def __init__(self):
+		self._event_index = None
+		self._view_backend = None
+		self._cal_dict = None
+		self._records = None
+		self._stale_cal_uids = None
+		self._delta_writes = {}
+		self._listeners = []
+		self._view_handler = None
+
+	def add_listener(self, callback):
+		self._listeners.append(callback)
+
+	def remove_listener(self, callback):
+		if callback in self._listeners:
+			self._listeners.remove(callback)
+
+	def set_view_handler(self, callback):
+		''' Let @callback decide when to publish changes seen by the views
+		of the "views" backend, instead of notifying the listeners at once '''
+		self._view_handler = callback
+
+	def _notify(self):
+		for callback in list(self._listeners):
+			callback()
+
+	def _on_view_changed(self):
+		if self._view_handler is not None:
+			self._view_handler()
+		else:
+			self._notify()
+
+	def invalidate(self, cal_uids=None):
+		''' Check @cal_uids again on next use, or all calendars if None '''
+		if cal_uids is None:
+			self._stale_cal_uids = None
+		elif self._stale_cal_uids is not None:
+			self._stale_cal_uids.update(cal_uids)
+		self._notify()
+
+	def apply_delta(self, added=(), modified=(), removed=()):
+		''' Patch the loaded records with a CalendarView delta, see
+		_apply_event_delta(). Return False if they must be read again. '''
+		if self._view_backend is not None:
+			# The views of the backend get the same changes
+			return True
+		if self._records is None or self._stale_cal_uids is None:
+			return False
+		changed = _apply_event_delta(self._records, self._cal_dict,
+		                             added, modified, removed)
+		if changed is None:
+			return False
+		# Keep the index in step, the file will only change afterwards
+		now = time.time()
+		for cal_uid in changed:
+			self._event_index.set_events(cal_uid, dict((k, e)
+					for k, e in self._records.items() if e.cal_uid == cal_uid))
+			self._delta_writes[cal_uid] = now
+		return True
+
+	def adopt_write(self, cal_uid):
+		''' Return True if a change to the file of @cal_uid is most likely
+		EDS writing out a delta that was already applied. The index then
+		takes the new file signature without reading the file. '''
+		applied = self._delta_writes.get(cal_uid)
+		if applied is None or self._cal_dict is None or \
+				cal_uid not in self._cal_dict:
+			return False
+		if time.time() - applied > DELTA_WRITE_PERIOD:
+			del self._delta_writes[cal_uid]
+			return False
+		info = self._cal_dict[cal_uid]
+		path = _get_calendar_path(cal_uid, info["stub"],
+		                          info.get("kind", "calendar"))
+		self._event_index.set_signature(cal_uid, _get_file_signature(path))
+		return True
+
+	def close(self):
+		if self._view_backend is not None:
+			self._view_backend.close()
+			self._view_backend = None
+
+	def _get_view_records(self):
+		if self._view_backend is None:
+			self._view_backend = CalendarViewBackend(self._on_view_changed)
+			self._cal_dict = None
+		if self._cal_dict is None or self._stale_cal_uids is None:
+			self._cal_dict = _load_calendars()
+		self._stale_cal_uids = set()
+		self._records = self._view_backend.get_records(self._cal_dict,
+				_get_event_window())
+		return self._records
+
+	def get_records(self):
+		if __kupfer_settings__["calendar_backend"] == "views":
+			return self._get_view_records()
+		if self._view_backend is not None:
+			self.close()
+			self._records = None
+		if self._event_index is None:
+			self._event_index = EventIndex(EVENT_INDEX_CACHE)
+		if self._records is None or self._stale_cal_uids is None:
+			self._cal_dict, self._records = _load_event_dict(self._event_index)
+		elif self._stale_cal_uids:
+			self._cal_dict, self._records = _load_event_dict(self._event_index,
+					self._cal_dict, self._stale_cal_uids)
+		self._stale_cal_uids = set()
+		return self._records
+
+
+_event_store = None
+
+
+def _get_event_store():
+	global _event_store
+	if _event_store is None:
+		_event_store = EventStore()
+	return _event_store
+
+
+def _load_events(event_dict, alarm_store=None):
+	event_dict = dict((key, event) for key, event in event_dict.items()
+	                  if event.kind == "event")
+	upcoming = _get_upcoming_index()
+	upcoming.update(event_dict)
+
+	# Quicklist integration
+	quicklist = _get_quicklist()
+	quicklist.update(upcoming.later_today(datetime.datetime.now().astimezone()))
+	quicklist.publish(_get_launcher())
 
-                    
-	if ql is not None:
-		for c in ql.get_children():
-		    pretty.print_debug(__name__, c.property_get(Dbusmenu.MENUITEM_PROP_LABEL))        
-		#launcher.set_property("quicklist", ql)
+	_get_event_text_index().update(event_dict)
+
+	if alarm_store is not None:
+		alarm_store.update(event_dict.values())
+		alarm_store.flush()
+		alarm_store.schedule()
+
+	for event_key, event in event_dict.items():
+		oevent = Event(event)
+		yield oevent
 
 
 
@@ -481,6 +1985,116 @@ class OpenCalendarEvent (Action):
 
 
 
+class GcalSubmitQueue (object):
+    ''' Runs `gcalcli quick` submissions in the background
+
+    At most MAX_RUNNING calendars are worked on at once. Events queued
+    for a calendar that is already being worked on are added to its
+    running batch, so each calendar gets one chain of gcalcli calls.
+    Every submission is saved to @path until gcalcli succeeded or gave up
+    for good, so none is lost when Kupfer quits. Failed submissions are
+    retried every RETRY_DELAY seconds, up to MAX_ATTEMPTS times.
+    '''
+    MAX_RUNNING = 2
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 300
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = {}
+        self._running = set()
+        self._jobs = []
+        self._failed = []
+        self._retry_timeout = None
+        if os.path.exists(path):
+            # Left over from the last run, whether they failed or not
+            self._jobs = load_from_json(path) or []
+            self._failed = list(self._jobs)
+            self._schedule_retry()
+
+    def submit(self, gcal_uid, summary):
+        job = {"calendar": gcal_uid, "summary": summary, "attempts": 0}
+        self._jobs.append(job)
+        self._save()
+        self._queue(job)
+
+    def _queue(self, job):
+        self._pending.setdefault(job["calendar"], []).append(job)
+        self._run_next()
+
+    def _run_next(self):
+        for gcal_uid in list(self._pending):
+            if len(self._running) >= self.MAX_RUNNING:
+                break
+            if gcal_uid in self._running:
+                continue
+            self._running.add(gcal_uid)
+            self._run_batch(gcal_uid, self._pending.pop(gcal_uid))
+
+    def _run_batch(self, gcal_uid, jobs):
+        jobs.extend(self._pending.pop(gcal_uid, []))
+        if not jobs:
+            self._running.discard(gcal_uid)
+            self._run_next()
+            return
+        argv = ["gcalcli", "quick", "--calendar", gcal_uid, jobs[0]["summary"]]
+        def finished(acommand, stdout, stderr):
+            self._finished(gcal_uid, jobs, acommand, stderr)
+        utils.AsyncCommand(argv, finished, GCALCLI_TIMEOUT)
+
+    def _finished(self, gcal_uid, jobs, acommand, stderr):
+        job = jobs.pop(0)
+        if acommand.exit_status == 0:
+            self._remove(job)
+            uiutils.show_notification(_("Event created in %s") % gcal_uid,
+                                      job["summary"],
+                                      icon_name="org.gnome.Calendar")
+        else:
+            pretty.print_debug(__name__, "gcalcli quick failed", stderr)
+            job["attempts"] += 1
+            if job["attempts"] < self.MAX_ATTEMPTS:
+                message = _("Will try again later")
+                self._failed.append(job)
+            else:
+                self._remove(job)
+                message = _("Giving up")
+            uiutils.show_notification(_("Could not create event in %s") % gcal_uid,
+                                      job["summary"] + "\n" + message,
+                                      icon_name="dialog-error")
+        self._save()
+        self._schedule_retry()
+        self._run_batch(gcal_uid, jobs)
+
+    def _remove(self, job):
+        self._jobs = [other for other in self._jobs if other is not job]
+
+    def _save(self):
+        save_to_json_atomic(self._jobs, self.path)
+
+    def _schedule_retry(self):
+        if self._failed and self._retry_timeout is None:
+            self._retry_timeout = GLib.timeout_add_seconds(self.RETRY_DELAY,
+                                                           self._retry)
+
+    def _retry(self):
+        self._retry_timeout = None
+        failed, self._failed = self._failed, []
+        for job in failed:
+            self._queue(job)
+        return False
+
+
+_gcal_queue = None
+
+
+def _get_gcal_queue():
+    global _gcal_queue
+    if _gcal_queue is None:
+        _gcal_queue = GcalSubmitQueue(GCALD_QUEUE)
+    return _gcal_queue
+
+
+
 class CreateGcalEvent (Action):
     def __init__(self):
         Action.__init__(self, _("Create Event In Google Calendar"))
@@ -488,8 +2102,7 @@ class CreateGcalEvent (Action):
     def activate(self, leaf, obj):
         summary = leaf.object
         gcal_uid = obj.cid
-        cmd = '\'gcalcli --calendar ' + gcal_uid + " " + '"' + summary + '"\''
-        subprocess.check_call(["gcalcli", "quick", "--calendar", gcal_uid, summary])
+        _get_gcal_queue().submit(gcal_uid, summary)
 
     def item_types(self):
         yield TextLeaf
@@ -528,14 +2141,17 @@ class Gcalendar(Leaf):
 
 
 class Event (Leaf):
-    def __init__(self, event_uid, title, due):
-        Leaf.__init__(self, event_uid, title)
-        self.eid = event_uid
-        self.title = title
-        self.due = due
+    def __init__(self, event):
+        Leaf.__init__(self, event.key, event.title)
+        self.eid = event.uid
+        self.title = event.title
+        self.event = event
 
     def get_description(self):
-        descr = "Due : %s" % self.due
+        due = _format_due(self.event)
+        if self.event.location:
+            due = due + ", " + self.event.location
+        descr = "Due : %s" % due
         return descr
 
     def get_icon_name(self):
@@ -545,6 +2161,96 @@ class Event (Leaf):
         yield OpenCalendarEvent()
 
 
+EVENT_QUERY_FIELDS = {
+	"at": ("location", ),
+	"in": ("location", ),
+	"with": ("attendees", ),
+	"about": EVENT_TEXT_FIELDS,
+}
+
+
+class EventTextSource (TextSource):
+	''' Answer "events at <place>", "events with <name>" and
+	"events about <text>" from the loaded events '''
+	def __init__(self):
+		TextSource.__init__(self, _("Calendar Event Search"))
+
+	def get_rank(self):
+		return 80
+
+	def get_text_items(self, text):
+		words = text.split(None, 2)
+		if len(words) < 3 or words[0].lower() not in ("event", "events"):
+			return
+		fields = EVENT_QUERY_FIELDS.get(words[1].lower())
+		if fields is None:
+			return
+		for event in _get_event_text_index().search(words[2], fields):
+			yield Event(event)
+
+	def provides(self):
+		yield Event
+
+
+class UpcomingEvents (RunnableLeaf):
+	''' Show the next events and how long until the next one starts '''
+	def __init__(self):
+		RunnableLeaf.__init__(self, name=_("Upcoming Events"))
+
+	def run(self):
+		now = datetime.datetime.now().astimezone()
+		events = _get_upcoming_index().upcoming(now,
+				__kupfer_settings__["upcoming_count"])
+		if events:
+			body = "\n".join(_format_due(e) + "  " + e.title for e in events)
+		else:
+			body = _("No upcoming events")
+		uiutils.show_notification(self.get_description(), body,
+				icon_name="org.gnome.Calendar")
+
+	def get_description(self):
+		now = datetime.datetime.now().astimezone()
+		event = _get_upcoming_index().free_until(now)
+		if event is None:
+			return _("Free, no more events")
+		return _("Free until %s") % _format_due(event)
+
+	def get_icon_name(self):
+		return 'calendar'
+
+
+class ShowTasks (Action):
+    def __init__(self):
+        Action.__init__(self, _("Show Tasks"))
+
+    def activate(self, leaf):
+        spawn_async(("evolution", "-c", "tasks"))
+
+    def get_icon_name(self):
+        return 'evolution-tasks'
+
+    def get_description(self):
+        return _("Show the task lists in Evolution")
+
+
+class Task (Leaf):
+    def __init__(self, task):
+        Leaf.__init__(self, task.key, task.title)
+        self.eid = task.uid
+        self.task = task
+
+    def get_description(self):
+        if self.task.start is None:
+            return _("No due date")
+        return "Due : %s" % _format_due(self.task)
+
+    def get_icon_name(self):
+        return 'evolution-tasks'
+
+    def get_actions(self):
+        yield ShowTasks()
+
+
 class AccountStatus(Leaf):
     pass
 
@@ -572,7 +2278,7 @@ class GcalendarSource(Source):
         Source.__init__(self, _("Calendar Source"))
 
     def get_items(self):
-        gcald = _load_gcals()
+        gcald = _load_gcals(self.mark_for_update)
         for gcal_uid, gcal_name in gcald.items():
             yield Gcalendar(gcal_uid, gcal_name)
 
@@ -584,47 +2290,220 @@ class GcalendarSource(Source):
 
 
 
+class RefreshScheduler (object):
+	''' Coalesce calendar refresh triggers
+
+	Triggers arriving less than @quiet_period ms apart are merged into one
+	call of @callback with the set of calendar uids to read again, or None
+	when all calendars have to be read. A burst is never postponed for
+	more than MAX_QUIET_PERIODS quiet periods.
+	'''
+	MAX_QUIET_PERIODS = 5
+
+	def __init__(self, callback, quiet_period):
+		self.callback = callback
+		self.quiet_period = quiet_period
+		self.triggers = 0
+		self.refreshes = 0
+		self._cal_uids = set()
+		self._timeout = None
+		self._first_trigger = None
+
+	def trigger(self, cal_uid=None, reload=True):
+		''' Note a change to @cal_uid (None: unknown calendar). With
+		@reload False nothing needs to be read, only republished. '''
+		self.triggers += 1
+		if reload and cal_uid is None:
+			self._cal_uids = None
+		elif reload and self._cal_uids is not None:
+			self._cal_uids.add(cal_uid)
+
+		now = time.time()
+		if self._timeout is None:
+			self._first_trigger = now
+		elif now - self._first_trigger < \
+				self.MAX_QUIET_PERIODS * self.quiet_period / 1000.0:
+			GLib.source_remove(self._timeout)
+		else:
+			return
+		self._timeout = GLib.timeout_add(self.quiet_period, self._fire)
+
+	def _fire(self):
+		self._timeout = None
+		cal_uids, self._cal_uids = self._cal_uids, set()
+		self.refreshes += 1
+		pretty.print_debug(__name__, "Refreshing", cal_uids, "after",
+		                   self.triggers, "triggers,", self.refreshes, "refreshes")
+		self.callback(cal_uids)
+		return False
+
+	def cancel(self):
+		if self._timeout is not None:
+			GLib.source_remove(self._timeout)
+			self._timeout = None
+
+
+def _get_calendar_uid(path):
+	''' Return the uid of the calendar, task list or memo list that file
+	@path belongs to '''
+	cal_dir = os.path.dirname(path)
+	cal_uid = os.path.basename(cal_dir)
+	if cal_uid == "system":
+		kind = os.path.basename(os.path.dirname(cal_dir))
+		cal_uid = EDS_SOURCE_FILES.get(kind, EDS_SOURCE_FILES["calendar"])[3]
+	return cal_uid
+
+
 class EventSource (AppLeafContentMixin, ToplevelGroupingSource, FilesystemWatchMixin):
 	appleaf_content_id = Calendar_ID
 
 	def __init__(self, name=None):
 		ToplevelGroupingSource.__init__(self, name, _("Calendar Events"))
 		self._event = []
+		self._scheduler = None
+		self._alarm_store = None
+		self._midnight_timeout = None
 		self._version = 3
 
 	def initialize(self):
 		ToplevelGroupingSource.initialize(self)
+		_update_event_window()
+		self._midnight_timeout = GLib.timeout_add_seconds(_seconds_to_midnight(),
+				self._on_midnight)
+		self._alarm_store = AlarmStore(os.path.join(EDS_ALARMS_PATH, "alarms.json"))
+		# Pick up gcalcli submissions left over from the last session
+		_get_gcal_queue()
+		self._scheduler = RefreshScheduler(self._on_refresh,
+				__kupfer_settings__["refresh_quiet_period"])
+		_get_event_store().add_listener(self._on_store_changed)
+		_get_event_store().set_view_handler(self._on_view_changed)
+		__kupfer_settings__.connect("plugin-setting-changed", self._setting_changed)
 		
-		eds_cache = _get_calendar_dirs(EDS_CAL_PATH, EDS_CAL_WEB_PATH)
+		eds_cache = []
+		for local_path, web_path, _name, _uid in EDS_SOURCE_FILES.values():
+			eds_cache += _get_calendar_dirs(local_path, web_path)
 		if eds_cache:
 			#path = list(self.get_path())
 			self.monitor_token = self.monitor_directories(*eds_cache)
 
 		bus = dbus.SessionBus()
-		dbus_signal_connect_weakly(bus, "objects_modified", self._on_events_updated,
-									dbus_interface="org.gnome.evolution.dataserver.CalendarView")
+		view_iface = "org.gnome.evolution.dataserver.CalendarView"
+		dbus_signal_connect_weakly(bus, "ObjectsAdded", self._on_objects_added,
+									dbus_interface=view_iface)
+		dbus_signal_connect_weakly(bus, "ObjectsModified", self._on_objects_modified,
+									dbus_interface=view_iface)
+		dbus_signal_connect_weakly(bus, "ObjectsRemoved", self._on_objects_removed,
+									dbus_interface=view_iface)
+
+	def finalize(self):
+		_get_event_store().remove_listener(self._on_store_changed)
+		_get_event_store().set_view_handler(None)
+		_get_event_store().close()
+		cache_db_pool.close()
+		if self._scheduler is not None:
+			self._scheduler.cancel()
+		if self._alarm_store is not None:
+			self._alarm_store.cancel()
+		if self._midnight_timeout is not None:
+			GLib.source_remove(self._midnight_timeout)
+			self._midnight_timeout = None
+		ToplevelGroupingSource.finalize(self)
+
+	def _on_midnight(self):
+		''' Roll the event window over to the new day '''
+		self._midnight_timeout = GLib.timeout_add_seconds(_seconds_to_midnight(),
+				self._on_midnight)
+		if _update_event_window():
+			self._scheduler.trigger(None)
+		return False
 
 	def monitor_include_file(self, gfile):
-		return gfile and (gfile.get_basename().endswith('.ics') \
+		''' Calendar file changes go through the refresh scheduler, so this
+		never asks FilesystemWatchMixin for an immediate update '''
+		if gfile and (gfile.get_basename().endswith('.ics') \
 		        or (gfile.get_basename().endswith('.db') \
 		        or gfile.get_basename() == 'calendar.ics') \
-		        or gfile.get_basename() == 'cache.db')
+		        or gfile.get_basename() == 'cache.db'):
+			cal_uid = _get_calendar_uid(gfile.get_path())
+			if not _get_event_store().adopt_write(cal_uid):
+				self._scheduler.trigger(cal_uid)
+		return False
 
-	def _on_events_updated (self, name):
-		#s = name[0]
-		#s = (s[s.find("LAST-MODIFIED:")+len("LAST-MODIFIED:"):s.rfind("\nEND:VEVENT")])
-		self.mark_for_update()
-		#self.get_items()
+	def mark_for_update(self, *args, **kwargs):
+		_get_event_store().invalidate(None)
+
+	def _on_store_changed(self):
+		ToplevelGroupingSource.mark_for_update(self)
+
+	def _on_view_changed(self):
+		# The views already hold the change, it only needs publishing
+		self._scheduler.trigger(reload=False)
+
+	def _setting_changed(self, settings, key, value):
+		if key == "calendar_backend":
+			_get_event_store().invalidate(None)
+
+	def _on_refresh(self, cal_uids):
+		_get_event_store().invalidate(cal_uids)
+
+	def _on_objects_added(self, objects):
+		self._on_events_updated(added=[str(o) for o in objects])
+
+	def _on_objects_modified(self, objects):
+		self._on_events_updated(modified=[str(o) for o in objects])
+
+	def _on_objects_removed(self, uids):
+		self._on_events_updated(removed=[str(u) for u in uids])
+
+	def _on_events_updated(self, added=(), modified=(), removed=()):
+		''' Patch the current events with a CalendarView delta, or fall back
+		to reading the calendars again '''
+		if not _get_event_store().apply_delta(added, modified, removed):
+			self._scheduler.trigger(None)
+			return
+		pretty.print_debug(__name__, "Applied calendar delta")
+		self._scheduler.trigger(reload=False)
 
 	def get_items(self):
 		#interface = _create_dbus_connection(SERVICE_NAME, OBJECT_NAME, IFACE_NAME, activate=True)
-		self._event = list(_load_events())
-		return self._event
+		event_dict = _get_event_store().get_records()
+		self._event = list(_load_events(event_dict, self._alarm_store))
+		return [UpcomingEvents()] + self._event
 
 	def get_icon_name(self):
 		return 'calendar'
 
 	def provides(self):
 		yield Event
+		yield RunnableLeaf
 
 
+class TaskSource (ToplevelGroupingSource):
+	''' Open tasks of the EDS task lists, read along with the calendars '''
+	def __init__(self, name=None):
+		ToplevelGroupingSource.__init__(self, name, _("Tasks"))
+
+	def initialize(self):
+		ToplevelGroupingSource.initialize(self)
+		_get_event_store().add_listener(self._on_store_changed)
+
+	def finalize(self):
+		_get_event_store().remove_listener(self._on_store_changed)
+		ToplevelGroupingSource.finalize(self)
+
+	def _on_store_changed(self):
+		self.mark_for_update()
+
+	def get_items(self):
+		tasks = [t for t in _get_event_store().get_records().values()
+		         if t.kind == "task"]
+		# Tasks without a due date go last
+		far = datetime.datetime.max.replace(tzinfo=datetime.timezone.utc)
+		tasks.sort(key=lambda t: t.start or far)
+		return [Task(t) for t in tasks]
+
+	def get_icon_name(self):
+		return 'evolution-tasks'
+
+	def provides(self):
+		yield Task
@@ -9,16 +9,35 @@ __author__ = ""
 
 import sys
 import os
-import dbus
+import json
+import tempfile
 import gi
-import subprocess
 import hashlib
+from concurrent import futures
+import quopri
 import vobject
 import xdg.BaseDirectory as base
+from libtools.json_tools import load_from_json
 from xml.dom import minidom
+try:
+    from libtools.json_tools import save_to_json_atomic
+except ImportError:
+    def save_to_json_atomic(obj, path):
+        ''' Write @obj to @path as JSON through a temporary file and a rename,
+        so readers never see a half-written file '''
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as tmp:
+                json.dump(obj, tmp)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
 gi.require_version('EBook', '1.2')
 
-from gi.repository import EBook
+from gi.repository import EBook, GLib
 from gi.repository import EDataServer, EBookContacts
 
 from kupfer import plugin_support
@@ -31,10 +50,24 @@ from kupfer.obj.apps import AppLeafContentMixin
 from kupfer.obj.grouping import ToplevelGroupingSource
 from kupfer.obj.contacts import ContactLeaf, EmailContact, is_valid_email
 from kupfer.obj.contacts import EMAIL_KEY, NAME_KEY
-from kupfer.weaklib import dbus_signal_connect_weakly
 
 plugin_support.check_dbus_connection()
 
+__kupfer_settings__ = plugin_support.PluginSettings(
+    {
+        "key": "live_updates",
+        "label": _("Follow address book changes as they happen"),
+        "type": bool,
+        "value": True,
+    },
+    {
+        "key": "book_timeout",
+        "label": _("Wait for each address book (seconds)"),
+        "type": int,
+        "value": 2,
+    },
+)
+
 Contact_ID = "org.gnome.Contacts"
 
 
@@ -44,61 +77,14 @@ esources = EDataServer.SourceRegistry.list_enabled(registry,
                         EDataServer.SOURCE_EXTENSION_ADDRESS_BOOK)
 
 
-#get EDS_FACTORY_BUS
-EDS_FACTORY_OBJ = "/org/gnome/evolution/dataserver/AddressBookFactory"
-EDS_FACTORY_IFACE = "org.gnome.evolution.dataserver.AddressBookFactory"
+CONTACT_CACHE = (os.path.join(base.xdg_data_home, "kupfer/plugins/gcontacts.json"))
+CONTACT_CACHE_VERSION = 1
 
-EDS_SUBPROCESS_IFACE = "org.gnome.evolution.dataserver.AddressBook"
 INDIVIDUAL_ID_KEY = "CID"
 CONTACT_NAME = "CONTACT_NAME"
 CONTACT_EMAILS = "CONTACT_EMAILS"
 
 
-def _search_bus_name(SERVICE_NAME_FILTER, activate=False):
-
-    interface = None
-    obj = None
-    sbus = dbus.SessionBus()
-
-    try:
-        #check for running pidgin (code from note.py)
-        proxy_obj = sbus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
-        dbus_iface = dbus.Interface(proxy_obj, 'org.freedesktop.DBus')
-        bus_names = dbus_iface.ListActivatableNames()
-        eds_adb = list(filter(lambda x:SERVICE_NAME_FILTER in x, bus_names))
-        if eds_adb:
-            EDS_FACTORY_BUS = eds_adb[0]
-    except dbus.exceptions.DBusException as err:
-        pretty.print_debug(__name__, err)
-    return EDS_FACTORY_BUS
-                
-EDS_FACTORY_BUS = _search_bus_name("org.gnome.evolution.dataserver.AddressBook")
-
-
-
-def _create_dbus_connection(SERVICE_NAME, OBJECT_NAME, IFACE_NAME, activate=False):
-    ''' Create dbus connection to EDS Addressbook
-    @activate: true=starts EDS Addressbook if not running
-    usually eds addressbook subprocesses starts at boot and keep 
-    running in the background
-    '''
-    interface = None
-    obj = None
-    sbus = dbus.SessionBus()
-
-    try:
-        #check for running pidgin (code from note.py)
-        proxy_obj = sbus.get_object('org.freedesktop.DBus', '/org/freedesktop/DBus')
-        dbus_iface = dbus.Interface(proxy_obj, 'org.freedesktop.DBus')
-        if activate or dbus_iface.NameHasOwner(SERVICE_NAME):
-            obj = sbus.get_object(SERVICE_NAME, OBJECT_NAME)
-        if obj:
-            interface = dbus.Interface(obj, IFACE_NAME)
-    except dbus.exceptions.DBusException as err:
-        pretty.print_debug(__name__, err)
-    return interface
-
-
 class ComposeMail(RunnableLeaf):
     ''' Create new mail without recipient '''
     def __init__(self):
@@ -117,80 +103,358 @@ class ComposeMail(RunnableLeaf):
 
 
 
-def _get_contact_pass_ids(esource):
-    ebc = EBook.BookClient.connect_sync(esource, 5, None)
-    q = EBookContacts.BookQuery.vcard_field_exists("N")
-    qr = q.to_string()
-    ret, contact_pass_ids = ebc.get_contacts_uids_sync(qr, None)
-    if ret:
-        return contact_pass_ids
+def _get_individual_id(addressbook_uid, contact_pass_id):
+    ''' Return the folks individual id of a contact, which is just the sha1
+    of its "eds:" uid '''
+    if 'http://' in contact_pass_id:
+        contact_uid = "eds:" + addressbook_uid + ":" + contact_pass_id.replace(":", "\\:")
     else:
-        return None
+        contact_uid = "eds:" + addressbook_uid + ":" + contact_pass_id
+    m = hashlib.sha1()
+    m.update(contact_uid.encode('UTF-8'))
+    return str(m.hexdigest())
+
+
+VCARD_FIELDS = ("FN", "N", "EMAIL", "TEL")
+VCARD_ESCAPES = {"n": "\n", "N": "\n", ",": ",", ";": ";", "\\": "\\"}
+
+
+def _split_unescaped(value, sep):
+    ''' Split @value on @sep, except where it is escaped with a backslash,
+    and unescape the parts '''
+    parts = [[]]
+    chars = iter(value)
+    for c in chars:
+        if c == "\\":
+            c = next(chars, "")
+            parts[-1].append(VCARD_ESCAPES.get(c, c))
+        elif c == sep:
+            parts.append([])
+        else:
+            parts[-1].append(c)
+    return ["".join(p) for p in parts]
+
+
+def _split_params(params):
+    ''' Split a property's parameters on ';', outside of double quotes '''
+    result = []
+    current = []
+    quoted = False
+    for c in params:
+        if c == '"':
+            quoted = not quoted
+        elif c == ";" and not quoted:
+            result.append("".join(current))
+            current = []
+            continue
+        current.append(c)
+    result.append("".join(current))
+    return result
+
+
+def _decode_vcard_line(line):
+    ''' Return (name, value) of unfolded property @line '''
+    quoted = False
+    for colon, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif c == ":" and not quoted:
+            break
+    else:
+        raise ValueError("No value in vCard line %r" % line[:40])
+    head, value = line[:colon], line[colon + 1:]
+    params = _split_params(head)
+    name = params.pop(0).rpartition(".")[2].upper()
+    charset = "utf-8"
+    qp = False
+    for param in params:
+        key, _sep, pvalue = param.partition("=")
+        key = key.upper()
+        if key == "ENCODING" and pvalue.upper() == "QUOTED-PRINTABLE" or \
+                key == "QUOTED-PRINTABLE":
+            qp = True
+        elif key == "CHARSET":
+            charset = pvalue.strip('"')
+    if qp:
+        value = quopri.decodestring(value.encode("latin-1", "replace"))
+        try:
+            value = value.decode(charset, "replace")
+        except (LookupError, UnicodeError) as err:
+            raise ValueError("Can't decode vCard line %r: %s" % (line[:40], err))
+    return name, value
+
+
+def _parse_vcard(contact_vcard, fields=VCARD_FIELDS):
+    ''' Return a dict of the values of @fields in vCard string
+    @contact_vcard, keyed by upper case name.
+
+    Lines are unfolded as they are read; properties that are not wanted,
+    PHOTO for one, are skipped without being joined or decoded. N values
+    are lists of their components. Raise ValueError on malformed cards.
+    '''
+    props = {}
+    lines = []
+    wanted = False
+    qp_soft_break = False
+
+    def flush():
+        if lines:
+            name, value = _decode_vcard_line("".join(lines))
+            if name == "N":
+                value = _split_unescaped(value, ";")
+            else:
+                value = _split_unescaped(value, None)[0]
+            props.setdefault(name, []).append(value)
+            del lines[:]
+
+    begun = ended = False
+    for line in contact_vcard.splitlines():
+        if qp_soft_break:
+            # Quoted-printable soft line break, drop the "=" and join
+            if wanted:
+                lines[-1] = lines[-1][:-1]
+                lines.append(line)
+            qp_soft_break = line.endswith("=")
+            continue
+        if line[:1] in (" ", "\t"):
+            # Folded line of the previous property
+            if wanted:
+                lines.append(line[1:])
+            continue
+        flush()
+        if not line:
+            continue
+        upper = line[:12].upper()
+        if upper.startswith("BEGIN:VCARD"):
+            begun = True
+            continue
+        if upper.startswith("END:VCARD"):
+            ended = True
+            break
+        name = line[:len(line) - len(line.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                                                  "abcdefghijklmnopqrstuvwxyz"
+                                                  "0123456789-."))]
+        wanted = name.rpartition(".")[2].upper() in fields
+        if wanted:
+            lines.append(line)
+        qp_soft_break = line.endswith("=") and \
+                "QUOTED-PRINTABLE" in line.partition(":")[0].upper()
+    flush()
+    if not (begun and ended):
+        raise ValueError("Not a complete vCard")
+    return props
+
+
+def _read_vcard_fields(contact_vcard):
+    ''' Return (full name, emails, telephones) of @contact_vcard, using
+    _parse_vcard() and vobject for cards it can't read '''
+    try:
+        props = _parse_vcard(contact_vcard)
+    except ValueError as err:
+        pretty.print_debug(__name__, "Falling back to vobject", err)
+        vcard = vobject.readOne(contact_vcard)
+        props = {}
+        for key in VCARD_FIELDS:
+            for line in vcard.contents.get(key.lower(), ()):
+                value = line.value
+                if key == "N":
+                    value = [value.family, value.given]
+                props.setdefault(key, []).append(value)
+
+    emails = props.get("EMAIL") or [""]
+    telephones = props.get("TEL") or [""]
+    if "FN" in props:
+        full_name = props["FN"][0]
+    elif "N" in props:
+        n = props["N"][0]
+        name_family = n[0]
+        name_given = n[1] if len(n) > 1 else ""
+        full_name = name_given + name_family
+    else:
+        full_name = None
+    return full_name, emails, telephones
 
 
+def _record_from_vcard(addressbook_uid, contact_pass_id, contact_vcard):
+    ''' Return the compact record [uid, individual id, full name, emails,
+    telephones] of vCard string @contact_vcard, or None if it has no name '''
+    full_name, emails, telephones = _read_vcard_fields(contact_vcard)
+    if not full_name:
+        return None
+    return [contact_pass_id, _get_individual_id(addressbook_uid, contact_pass_id),
+            full_name, emails, telephones]
+
+
+def _contact_from_record(record):
+    _pass_id, contact_individual_id, full_name, emails, telephones = record
+    cobj = {"EMAIL": emails, "TEL": telephones}
+    return GnomeContact(contact_individual_id, full_name, cobj)
+
+
+class ContactCache (object):
+    ''' Contact records of each address book, stored on disk with the
+    revision of the book they were read at '''
+    def __init__(self, path):
+        self.path = path
+        self.books = {}
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            cache = load_from_json(self.path)
+        except Exception as err:
+            pretty.print_debug(__name__, "Discarding contact cache", err)
+            return
+        if cache and cache.get("version") == CONTACT_CACHE_VERSION:
+            self.books = cache.get("books", {})
+
+    def get_revision(self, addressbook_uid):
+        book = self.books.get(addressbook_uid)
+        return book["revision"] if book is not None else None
+
+    def get(self, addressbook_uid, revision=None):
+        ''' Return the records of @addressbook_uid, or None if there are
+        none or they are not of @revision (if given) '''
+        book = self.books.get(addressbook_uid)
+        if book is None or revision is not None and book["revision"] != revision:
+            return None
+        return book["contacts"]
+
+    def put(self, addressbook_uid, revision, records):
+        self.books[addressbook_uid] = {"revision": revision, "contacts": records}
+        self.dirty = True
+
+    def prune(self, addressbook_uids):
+        for uid in list(self.books):
+            if uid not in addressbook_uids:
+                del self.books[uid]
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            save_to_json_atomic({"version": CONTACT_CACHE_VERSION,
+                                "books": self.books}, self.path)
+            self.dirty = False
+        except OSError as err:
+            pretty.print_debug(__name__, "Can't save contact cache", err)
+
+
+def _connect_book(esource):
+    return EBook.BookClient.connect_sync(esource, 5, None)
+
+
+def _read_book(esource, cached_revision=None):
+    ''' Connect to address book @esource and return (client, revision,
+    records). Records are None if the book is still at @cached_revision.
+    Runs in a worker thread, so it doesn't touch any shared state. '''
+    addressbook_uid = esource.get_uid()
+    ebc = _connect_book(esource)
+    ret, revision = ebc.get_backend_property_sync("revision", None)
+    if not ret:
+        revision = None
+    if revision is not None and revision == cached_revision:
+        return ebc, revision, None
 
+    q = EBookContacts.BookQuery.vcard_field_exists("N")
+    ret, contacts = ebc.get_contacts_sync(q.to_string(), None)
+    records = []
+    if ret:
+        for contact in contacts:
+            record = _record_from_contact(addressbook_uid, contact)
+            if record is not None:
+                records.append(record)
+    return ebc, revision, records
 
-def _load_contacts(esources):
-    ''' Get service & ifcace name for each addressbooks and then load all contacts '''
-    for esource in esources:
-        adb_name = esource.get_display_name()
-        addressbook_uid = esource.get_uid()
-        if adb_name == "friends-twitter-contacts":
-            continue
-        
-        contact_pass_ids = _get_contact_pass_ids(esource)
-        
-        if contact_pass_ids is None:
-            continue
 
-        iface = _create_dbus_connection(EDS_FACTORY_BUS, EDS_FACTORY_OBJ, EDS_FACTORY_IFACE, activate=True)
-        EDS_SUBPROCESS_OBJ, EDS_SUBPROCESS_BUS  = iface.OpenAddressBook(addressbook_uid)
-        interface = _create_dbus_connection(EDS_SUBPROCESS_BUS, EDS_SUBPROCESS_OBJ, EDS_SUBPROCESS_IFACE)
-        interface.Open() #otherwise it may fail
+def _record_from_contact(addressbook_uid, contact):
+    ''' Return the record of EContact @contact, or None '''
+    contact_pass_id = contact.get_property("id")
+    try:
+        return _record_from_vcard(addressbook_uid, contact_pass_id,
+                contact.to_string(EBookContacts.VCardFormat.VCARD_30))
+    except (vobject.base.ParseError, LookupError, ValueError) as err:
+        # vobject gets unknown charsets wrong too
+        pretty.print_debug(__name__, "Couldn't load contact..skipping",
+                           contact_pass_id, err)
+        return None
 
-        for contact_pass_id in contact_pass_ids:
-            #Lets form contact_uid from pass_id
-            if 'http://' in contact_pass_id:        
-                contact_uid = "eds:" + addressbook_uid + ":" + contact_pass_id.replace(":", "\\:")
-            else:
-                contact_uid = "eds:" + addressbook_uid + ":" + contact_pass_id
-            #We also know individual id is just sha1 hash of uid, so
-            m = hashlib.sha1()
-            m.update(contact_uid.encode('UTF-8'))
-            contact_individual_id = str(m.hexdigest())
 
-            #we get contact vcard and parse it using python3-vobject
+def _get_address_books(esources):
+    return [esource for esource in esources
+            if esource.get_display_name() != "friends-twitter-contacts"]
+
+
+def _load_cached_contacts(esources, cache):
+    ''' Load the contacts of the last session without asking EDS '''
+    for esource in _get_address_books(esources):
+        for record in cache.get(esource.get_uid()) or ():
+            yield _contact_from_record(record)
+    yield ComposeMail()
+
+
+class BookViewWatcher (object):
+    ''' Keep a BookClientView open per address book and apply its
+    objects-added/modified/removed signals to the book's dict of records
+    by individual id. @on_changed is called with the address book uid. '''
+    def __init__(self, on_changed):
+        self._on_changed = on_changed
+        self._views = {}
+
+    def watch(self, addressbook_uid, ebc, records):
+        self.unwatch(addressbook_uid)
+        q = EBookContacts.BookQuery.vcard_field_exists("N")
+        try:
+            ret, view = ebc.get_view_sync(q.to_string(), None)
+        except GLib.Error as err:
+            pretty.print_debug(__name__, "Can't follow", addressbook_uid, err)
+            return
+        if not ret:
+            return
+        view.connect("objects-added", self._on_objects_changed,
+                     addressbook_uid, records)
+        view.connect("objects-modified", self._on_objects_changed,
+                     addressbook_uid, records)
+        view.connect("objects-removed", self._on_objects_removed,
+                     addressbook_uid, records)
+        # The records are already read
+        view.set_flags(EBook.BookClientViewFlags.NONE)
+        view.start()
+        # Keep the client alive along with its view
+        self._views[addressbook_uid] = (ebc, view)
+
+    def unwatch(self, addressbook_uid):
+        ebc_view = self._views.pop(addressbook_uid, None)
+        if ebc_view is not None:
             try:
-                contact_vcard = interface.GetContact(contact_pass_id)
-            except:
-                print ("Couldn't load contact..skipping {}".format(contact_pass_id))
-                
-            vcard = vobject.readOne( contact_vcard )
-            if 'email' in vcard.contents:
-                emails = [email.value for email in vcard.contents['email']]
-            else:
-                emails = [""]
-            if 'tel' in vcard.contents:
-                telephones = [tel.value for tel in vcard.contents['tel']]
-            else:
-                telephones = [""]
-            cobj = {"EMAIL": emails, "TEL": telephones}
-
-            if "fn" in vcard.contents:
-                full_name = vcard.fn.value
-            elif "n" in vcard.contents:
-                name_given = vcard.n.value.given
-                name_family = vcard.n.value.family
-                full_name = name_given + name_family
+                ebc_view[1].stop()
+            except GLib.Error as err:
+                pretty.print_debug(__name__, "Stopping view of",
+                                   addressbook_uid, err)
+
+    def close(self):
+        for addressbook_uid in list(self._views):
+            self.unwatch(addressbook_uid)
+
+    def _on_objects_changed(self, view, contacts, addressbook_uid, records):
+        for contact in contacts:
+            record = _record_from_contact(addressbook_uid, contact)
+            contact_individual_id = _get_individual_id(addressbook_uid,
+                    contact.get_property("id"))
+            if record is None:
+                records.pop(contact_individual_id, None)
             else:
-                continue
+                records[contact_individual_id] = record
+        self._on_changed(addressbook_uid)
 
-            if full_name == "":
-                continue
-
-            ocontact = GnomeContact(contact_individual_id, full_name, cobj)
-            yield ocontact
-            yield ComposeMail()
+    def _on_objects_removed(self, view, uids, addressbook_uid, records):
+        for contact_pass_id in uids:
+            records.pop(_get_individual_id(addressbook_uid, contact_pass_id), None)
+        self._on_changed(addressbook_uid)
 
 
 
@@ -317,14 +581,123 @@ class GnomeContactsSource (AppLeafContentMixin, ToplevelGroupingSource, Source):
     def __init__(self, name=None):
         ToplevelGroupingSource.__init__(self, name, _("GnomeContacts"))
         self._gnomecontacts = []
+        self._cache = None
+        self._books = None
+        self._generation = 0
+        self._leaves = {}
+        self._watcher = None
         self._version = 3
 
     def initialize(self):
         ToplevelGroupingSource.initialize(self)
-
+        self._watcher = BookViewWatcher(self._on_book_changed)
+        __kupfer_settings__.connect("plugin-setting-changed", self._setting_changed)
+
+    def finalize(self):
+        if self._watcher is not None:
+            self._watcher.close()
+        if self._cache is not None:
+            self._cache.save()
+        ToplevelGroupingSource.finalize(self)
+
+    def _setting_changed(self, settings, key, value):
+        if key == "live_updates":
+            self._watcher.close()
+            self._books = None
+            self.mark_for_update()
+
+    def _check_revisions(self):
+        self.mark_for_update()
+        return False
+
+    def _on_book_changed(self, addressbook_uid):
+        ''' A view changed the records of @addressbook_uid; they no longer
+        match a revision, so the cache only serves them at next start '''
+        self._cache.put(addressbook_uid, None,
+                        list(self._books[addressbook_uid].values()))
+        self.mark_for_update()
+
+    def _load_books(self):
+        ''' Read all address books in parallel worker threads, waiting at
+        most book_timeout seconds. Books that take longer are shown from
+        the cache and added when they are done. '''
+        self._watcher.close()
+        self._books = {}
+        self._generation += 1
+        books = _get_address_books(esources)
+        if not books:
+            return
+        pool = futures.ThreadPoolExecutor(max_workers=len(books))
+        tasks = dict((pool.submit(_read_book, esource,
+                                  self._cache.get_revision(esource.get_uid())),
+                      esource) for esource in books)
+        pool.shutdown(wait=False)
+        done, pending = futures.wait(tasks,
+                timeout=__kupfer_settings__["book_timeout"])
+        for task in done:
+            self._add_book(tasks[task], task)
+        for task in pending:
+            esource = tasks[task]
+            pretty.print_debug(__name__, "Still waiting for",
+                               esource.get_display_name())
+            records = self._cache.get(esource.get_uid()) or []
+            self._books[esource.get_uid()] = dict((r[1], r) for r in records)
+            task.add_done_callback(lambda task, esource=esource,
+                                   generation=self._generation:
+                    GLib.idle_add(self._on_late_book, esource, task, generation))
+        self._cache.prune([esource.get_uid() for esource in books])
+        self._cache.save()
+
+    def _add_book(self, esource, task):
+        ''' Take the result of _read_book() @task for @esource '''
+        addressbook_uid = esource.get_uid()
+        try:
+            ebc, revision, records = task.result()
+        except GLib.Error as err:
+            pretty.print_debug(__name__, "Couldn't load",
+                               esource.get_display_name(), err)
+            ebc = None
+            records = self._cache.get(addressbook_uid) or []
+        else:
+            if records is None:
+                records = self._cache.get(addressbook_uid)
+            elif revision is not None:
+                self._cache.put(addressbook_uid, revision, records)
+        self._books[addressbook_uid] = dict((r[1], r) for r in records)
+        if __kupfer_settings__["live_updates"] and ebc is not None:
+            self._watcher.watch(addressbook_uid, ebc,
+                                self._books[addressbook_uid])
+
+    def _on_late_book(self, esource, task, generation):
+        if generation == self._generation:
+            self._add_book(esource, task)
+            self._cache.save()
+            self.mark_for_update()
+        return False
 
     def get_items(self):
-        self._gnomecontacts = list(_load_contacts(esources))
+        if self._cache is None:
+            # Show the cached contacts right away, then check the books
+            self._cache = ContactCache(CONTACT_CACHE)
+            if self._cache.books:
+                GLib.idle_add(self._check_revisions)
+                self._gnomecontacts = list(_load_cached_contacts(esources,
+                                                                 self._cache))
+                return self._gnomecontacts
+        # In live mode the views keep the records current after the first load
+        if self._books is None or not __kupfer_settings__["live_updates"]:
+            self._load_books()
+        # Leaves of records that didn't change are reused
+        leaves = {}
+        for records in self._books.values():
+            for contact_individual_id, record in records.items():
+                leaf = self._leaves.get(contact_individual_id)
+                if leaf is None or leaf[0] is not record:
+                    leaf = (record, _contact_from_record(record))
+                leaves[contact_individual_id] = leaf
+        self._leaves = leaves
+        self._gnomecontacts = [leaf for _record, leaf in leaves.values()]
+        self._gnomecontacts.append(ComposeMail())
         return self._gnomecontacts
 
     def get_icon_name(self):